@@ -0,0 +1,87 @@
+"""
+Compares create_excel backends on a synthetic payroll roster.
+
+    python benchmarks/excel_backends.py --drivers 5000
+
+Each backend runs in a fresh process so peak RSS is not shared between runs.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+BACKENDS = {
+    "openpyxl": {"backend": "openpyxl"},
+    "openpyxl-streaming": {"backend": "openpyxl", "streaming": True},
+    "xlsxwriter": {"backend": "xlsxwriter"},
+}
+
+
+def synthetic_payroll(n_drivers, seed=0):
+    """final_df/relay_cols/adp_cols/override_map shaped like build_final_dataset output."""
+    rng = np.random.default_rng(seed)
+    start = date(2025, 2, 2)
+    days = [start + timedelta(days=i) for i in range(14)]
+    relay_cols = [f"R_{d}" for d in days]
+    adp_cols = [f"A_{d}" for d in days]
+    drivers = [f"DRIVER {i:05d}" for i in range(n_drivers)]
+
+    df = pd.DataFrame({"Driver": drivers})
+    df["Category"] = rng.choice(["PER_LOAD", "TARGET", "TIER_SWITCH", "HOURLY", None], n_drivers)
+    df["Package_Amount"] = rng.choice([2000, 3000], n_drivers)
+    df["Hourly_Rate"] = 24
+    df["Switch_After_Load"] = rng.integers(1, 4, n_drivers)
+    df["Switch_Type"] = rng.choice(["FIXED", "HOURLY"], n_drivers)
+    df["Target_Load"] = rng.choice([5, 8, 10], n_drivers)
+    relay = rng.choice([0, 0, 8.5, 11.25, 31.0], (n_drivers, 14), p=[0.4, 0.2, 0.2, 0.18, 0.02])
+    adp = rng.choice([0, 8, 9.5, 10], (n_drivers, 14))
+    df = pd.concat([
+        df,
+        pd.DataFrame(relay, columns=relay_cols),
+        pd.DataFrame(adp, columns=adp_cols),
+    ], axis=1)
+    override_map = {(d, days[0]): 150 for d in drivers[::25]}
+    return df, relay_cols, adp_cols, override_map
+
+
+def _run(name, n_drivers, queue):
+    from payroll_app.excel_builder import create_excel
+
+    data = synthetic_payroll(n_drivers)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    out, _ = create_excel(*data, **BACKENDS[name])
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, rss_before, rss_after, len(out.getvalue())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--drivers", type=int, default=5000)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'backend':<20}{'seconds':>10}{'peak RSS MB':>14}{'+ for write':>14}{'file KB':>10}")
+    for name in args.backends:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(name, args.drivers, queue))
+        proc.start()
+        elapsed, rss_before, rss_after, size = queue.get()
+        proc.join()
+        # ru_maxrss is KiB on Linux
+        print(f"{name:<20}{elapsed:>10.2f}{rss_after / 1024:>14.1f}"
+              f"{(rss_after - rss_before) / 1024:>14.1f}{size / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""On-disk cache of resolved driver names (raw name -> ADP name)."""
+
+import hashlib
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+
+def normalize_name(name):
+    return str(name).upper().strip()
+
+
+def roster_version(target_names):
+    """Order-independent fingerprint of an ADP roster."""
+    joined = "\n".join(sorted({str(n) for n in target_names}))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+class AliasStore:
+    """
+    SQLite-backed alias cache shared across pay periods.
+
+    Each fuzzy result is stored with its best ADP candidate, its score and
+    the roster version it was scored against. When the roster changes, old
+    entries are only re-scored if their candidate left the roster or one of
+    the newly added names scores at least as well. Pinned aliases are set
+    by hand and always win.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS aliases (
+                    raw_name       TEXT PRIMARY KEY,
+                    adp_name       TEXT,
+                    score          REAL NOT NULL,
+                    roster_version TEXT,
+                    pinned         INTEGER NOT NULL DEFAULT 0,
+                    updated_at     TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS rosters (
+                    version TEXT PRIMARY KEY,
+                    names   TEXT NOT NULL
+                );
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _fetch(self, keys):
+        rows = {}
+        with closing(self._connect()) as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows.update(
+                    (r[0], r[1:])
+                    for r in conn.execute(
+                        "SELECT raw_name, adp_name, score, roster_version, pinned "
+                        f"FROM aliases WHERE raw_name IN ({marks})",
+                        chunk,
+                    )
+                )
+        return rows
+
+    def _roster(self, version):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT names FROM rosters WHERE version = ?", (version,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, matches, version, target_names):
+        now = datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO rosters (version, names) VALUES (?, ?)",
+                (version, json.dumps(sorted(set(target_names)))),
+            )
+            conn.executemany(
+                "INSERT INTO aliases (raw_name, adp_name, score, roster_version, pinned, updated_at) "
+                "VALUES (?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT(raw_name) DO UPDATE SET adp_name = excluded.adp_name, "
+                "score = excluded.score, roster_version = excluded.roster_version, "
+                "updated_at = excluded.updated_at WHERE pinned = 0",
+                [(key, cand, float(score), version, now) for key, (cand, score) in matches.items()],
+            )
+
+    def resolve(self, keys, target_names, score_names):
+        """
+        Returns {key: (best ADP candidate, score)} for normalized keys.
+        score_names(keys, targets) -> [(candidate, score), ...] is only
+        called for names that are new or whose cached result may be stale.
+        Pinned aliases come back with a score of 100.
+        """
+        target_names = list(target_names)
+        version = roster_version(target_names)
+        roster = set(target_names)
+        cached = self._fetch(list(keys))
+
+        result, updates, to_score, stale = {}, {}, [], {}
+        for key in keys:
+            row = cached.get(key)
+            if row is None:
+                to_score.append(key)
+                continue
+            adp_name, score, row_version, pinned = row
+            if pinned:
+                result[key] = (adp_name, 100.0)
+            elif row_version == version:
+                result[key] = (adp_name, score)
+            else:
+                stale.setdefault(row_version, []).append(key)
+
+        # Re-check entries scored against an older roster
+        for old_version, old_keys in stale.items():
+            old_roster = self._roster(old_version)
+            if old_roster is None:
+                to_score.extend(old_keys)
+                continue
+            old_set = set(old_roster)
+            added = [n for n in target_names if n not in old_set]
+            challengers = score_names(old_keys, added) if added else [(None, -1.0)] * len(old_keys)
+            for key, (_, new_score) in zip(old_keys, challengers):
+                adp_name, score = cached[key][0], cached[key][1]
+                if (adp_name is not None and adp_name not in roster) or new_score >= score:
+                    to_score.append(key)
+                else:
+                    result[key] = updates[key] = (adp_name, score)
+
+        if to_score:
+            for key, match in zip(to_score, score_names(to_score, target_names)):
+                result[key] = updates[key] = match
+
+        if updates:
+            self._save(updates, version, target_names)
+        return result
+
+    def pin(self, raw_name, adp_name):
+        """Forces raw_name to resolve to adp_name regardless of fuzzy score."""
+        now = datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO aliases (raw_name, adp_name, score, roster_version, pinned, updated_at) "
+                "VALUES (?, ?, 100, NULL, 1, ?) "
+                "ON CONFLICT(raw_name) DO UPDATE SET adp_name = excluded.adp_name, "
+                "score = 100, roster_version = NULL, pinned = 1, updated_at = excluded.updated_at",
+                (normalize_name(raw_name), normalize_name(adp_name), now),
+            )
+
+    def unpin(self, raw_name):
+        """Drops a pinned alias so the name is fuzzy matched again next run."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM aliases WHERE raw_name = ? AND pinned = 1",
+                (normalize_name(raw_name),),
+            )
+
+    def pinned(self):
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT raw_name, adp_name FROM aliases WHERE pinned = 1 ORDER BY raw_name"
+            ).fetchall()
+
+    def clear(self):
+        """Forgets every fuzzy result; pinned aliases are kept."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM aliases WHERE pinned = 0")
+            conn.execute("DELETE FROM rosters")
@@ -0,0 +1,146 @@
+"""
+On-disk caches: parsed input frames (Parquet, content-addressed) and raw
+SharePoint downloads (per drive item, with the tag they were fetched at).
+"""
+
+import hashlib
+import os
+import uuid
+
+import pandas as pd
+
+# Bump when parsing logic changes so stale frames are never served
+CACHE_VERSION = "3"
+
+
+def _evict_lru(root, suffix, max_bytes):
+    """Deletes the least recently used files ending in suffix until root fits max_bytes."""
+    entries = []
+    for entry in os.scandir(root):
+        if entry.name.endswith(suffix):
+            try:
+                info = entry.stat()
+            except OSError:
+                continue  # removed meanwhile
+            entries.append((info.st_mtime, info.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+class FrameCache:
+    """
+    Stores DataFrames as Parquet files named by a hash of the raw input
+    bytes. Reads refresh a file's mtime; once the directory grows past
+    max_bytes the least recently used files are deleted.
+    """
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(namespace, content, *extra):
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (CACHE_VERSION, namespace, *extra):
+            digest.update(str(part).encode("utf-8") + b"\0")
+        digest.update(content)
+        return f"{namespace}-{digest.hexdigest()}"
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.parquet")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+            return df
+        except Exception:
+            return None
+
+    def put(self, key, df):
+        """Caches df; frames Parquet can't represent (mixed-type columns) are skipped."""
+        path = self._path(key)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        except Exception as exc:
+            print(f"Frame cache skipped {key}: {exc}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._evict()
+
+    def _evict(self):
+        _evict_lru(self.root, ".parquet", self.max_bytes)
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached frame for key, or computes, caches and returns it."""
+        df = self.get(key)
+        if df is None:
+            df = compute()
+            if df is not None:
+                self.put(key, df)
+        return df
+
+
+class DownloadCache:
+    """
+    Raw file contents from SharePoint, one file per drive item holding the
+    eTag/cTag it was downloaded at on its first line. Reads refresh an
+    entry's mtime; past max_bytes the least recently used are deleted.
+    """
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, site_id, item_id):
+        digest = hashlib.blake2b(f"{site_id}\0{item_id}".encode("utf-8"), digest_size=20)
+        return os.path.join(self.root, f"{digest.hexdigest()}.blob")
+
+    def tag(self, site_id, item_id):
+        """The tag of the cached copy of an item, or None."""
+        try:
+            with open(self._path(site_id, item_id), "rb") as fh:
+                return fh.readline().rstrip(b"\n").decode("utf-8")
+        except OSError:
+            return None
+
+    def get(self, site_id, item_id, tag):
+        """Cached content of an item if it was stored at tag, else None."""
+        path = self._path(site_id, item_id)
+        try:
+            with open(path, "rb") as fh:
+                if fh.readline().rstrip(b"\n").decode("utf-8") != tag:
+                    return None
+                content = fh.read()
+            os.utime(path)
+            return content
+        except OSError:
+            return None
+
+    def put(self, site_id, item_id, tag, content):
+        path = self._path(site_id, item_id)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                fh.write(tag.encode("utf-8") + b"\n")
+                fh.write(content)
+            os.replace(tmp, path)
+        except OSError as exc:
+            print(f"Download cache skipped {item_id}: {exc}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        _evict_lru(self.root, ".blob", self.max_bytes)
@@ -1,9 +1,81 @@
+import os
+
 import streamlit as st
 from openpyxl.styles import PatternFill, Border, Side
 
 REG_RATE = 24
 OT_RATE = 36
 
+# rapidfuzz cdist threads for driver name matching (-1 = all CPU cores)
+FUZZY_WORKERS = -1
+
+# Process pool size for Relay files (1 = in-process, None = one per CPU).
+# Workers are spawned rather than forked from the Streamlit server, on the
+# first run that needs them, and kept for later runs.
+RELAY_WORKERS = 1
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cross-period raw name -> ADP name cache, kept next to app.py
+ALIAS_DB_PATH = os.path.join(APP_DIR, "driver_aliases.db")
+
+# Parsed-input Parquet cache, keyed by file content hash (LRU by size)
+FRAME_CACHE_DIR = os.path.join(APP_DIR, ".payroll_cache")
+FRAME_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# SharePoint downloads kept by drive item and eTag, revalidated on each use (LRU by size)
+DOWNLOAD_CACHE_DIR = os.path.join(APP_DIR, ".download_cache")
+DOWNLOAD_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Default workbook writer ("openpyxl" or "xlsxwriter"); can be changed per run in the UI
+EXCEL_BACKEND = "openpyxl"
+
+# Write the payroll sheet row by row (openpyxl write_only) to keep memory flat
+EXCEL_STREAMING = False
+
+# Hide zeros and highlight Solo5/override/anomaly cells with range-level
+# conditional formatting instead of per-cell styles
+EXCEL_CONDITIONAL_FORMATTING = False
+
+# Refer to pay rates by name (hidden Rates sheet) and build formulas from
+# per-column templates for smaller, faster-recalculating workbooks.
+# Not used for sheets added to an existing workbook.
+EXCEL_COMPACT_FORMULAS = False
+
+# Default calculated cell contents: "formulas", "cached" (formulas with
+# precomputed results, xlsxwriter) or "values" (plain numbers, for archiving)
+EXCEL_CELL_VALUES = "formulas"
+
+# Extra outputs of final data + pay columns ("parquet", "csv"); and whether
+# to skip the workbook altogether when only those are wanted
+TABLE_EXPORTS = ()
+SKIP_EXCEL = False
+
+# Workbook size tuning, applied after writing and when merging: zip deflate
+# level 0-9 (None: library default), strings in one shared table (True) or
+# inline in the cells (False; None keeps the writer's choice), and dropping
+# style records no cell uses
+EXCEL_COMPRESS_LEVEL = None
+EXCEL_SHARED_STRINGS = None
+EXCEL_PRUNE_STYLES = False
+
+# Keep-alive connections per SharePoint/Graph host, shared by the whole
+# process; requests beyond it wait for a free connection
+GRAPH_POOL_SIZE = 16
+
+# Files downloaded in parallel when several are picked from SharePoint
+DOWNLOAD_WORKERS = GRAPH_POOL_SIZE
+
+# Seconds a SharePoint folder listing is reused across reruns; with
+# LISTING_DELTA, expired listings are refreshed from the drive's delta feed
+LISTING_TTL = 60
+LISTING_DELTA = False
+
+# Resumable uploads: chunk size (Graph wants a multiple of 320 KiB) and
+# attempts per chunk after a failure
+UPLOAD_CHUNK_SIZE = 32 * 320 * 1024
+UPLOAD_RETRIES = 4
+
 REDIRECT_URI = "https://adppayroll.streamlit.app/"
 SCOPES = [
     "https://graph.microsoft.com/Files.ReadWrite.All",
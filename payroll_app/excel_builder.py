@@ -293,17 +293,193 @@
 #     return out, []
 
 import io
+import itertools
+import math
+from collections import namedtuple
 from datetime import datetime
 from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+from openpyxl.workbook.defined_name import DefinedName
+from payroll_app.pay_engine import LOAD_PAY, PAY_COLUMNS, TIER_PAY, WEEK_HOURS, compute_pay
+from payroll_app.processing import override_totals
+from payroll_app.xlsx_merge import tune_package
 from payroll_app.config import * # Ensure HEADER_FILL, RELAY_FILL, ADP_FILL, DRIVER_FILL, OVERRIDE_FILL, ANOMALY_FILL, THICK_BORDER, THIN_BORDER are defined
 
-def create_excel(final_df, relay_cols, adp_cols, override_map):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Payroll"
-
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+EXCEL_BACKENDS = ("openpyxl", "xlsxwriter")
+
+# What calculated cells hold: live formulas, formulas plus their cached
+# results (xlsxwriter only; openpyxl can't store results), or plain values
+CELL_VALUE_MODES = ("formulas", "cached", "values")
+
+# Excel 2019/365 engine id; files saved by an older engine are recalculated on open
+EXCEL_CALC_ID = 191029
+
+COLUMN_WIDTH = 16
+
+SOLO5_FILL = PatternFill(start_color="9B59B6", end_color="9B59B6", fill_type="solid")  # purple
+
+# positive;negative;zero;text — the empty zero section hides zeros whatever
+# the value, including formula results and later edits in Excel
+ZERO_HIDDEN_FORMAT = "General;-General;;@"
+
+# Hidden sheet holding the rates that compact_formulas mode refers to by name
+RATES_SHEET = "Rates"
+
+def _rates_rows():
+    """Rows of the Rates sheet, and defined name -> cell range pointing into it."""
+    tiers = sorted(TIER_PAY.items())
+    rates = [("LoadPay", LOAD_PAY), ("RegRate", REG_RATE), ("OtRate", OT_RATE), ("WeekHours", WEEK_HOURS)]
+    rows = [["Loads", "Tier Pay", None, "Rate", "Value"]]
+    for i in range(max(len(tiers), len(rates))):
+        load, pay = tiers[i] if i < len(tiers) else (None, None)
+        name, value = rates[i] if i < len(rates) else (None, None)
+        rows.append([load, pay, None, name, value])
+    names = {
+        "TierLoads": f"{RATES_SHEET}!$A$2:$A${len(tiers) + 1}",
+        "TierPay": f"{RATES_SHEET}!$B$2:$B${len(tiers) + 1}",
+    }
+    for row_idx, (name, _) in enumerate(rates, start=2):
+        names[name] = f"{RATES_SHEET}!$E${row_idx}"
+    return rows, names
+
+# Every cell kind in the payroll sheet, registered once per workbook as a
+# NamedStyle. Body kinds also get a "<kind>_zero" variant that hides zeros,
+# and a "<kind>_cf" variant for conditional_formatting mode.
+_HEADER_STYLE = {
+    "fill": HEADER_FILL,
+    "font": Font(bold=True, color="FFFFFF"),
+    "alignment": Alignment(horizontal="center", vertical="center"),
+}
+_BODY_STYLES = {
+    "data":     {},
+    "driver":   {"fill": DRIVER_FILL},
+    "anomaly":  {"fill": ANOMALY_FILL},
+    "relay":    {"fill": RELAY_FILL},
+    "adp":      {"fill": ADP_FILL},
+    "solo5":    {"fill": SOLO5_FILL, "font": Font(bold=True, color="FFFFFF")},
+    "override": {"fill": OVERRIDE_FILL},
+    "calc":     {},
+}
+
+def _style_specs():
+    """style key -> NamedStyle keyword arguments."""
+    specs = {"header": dict(_HEADER_STYLE, border=THIN_BORDER)}
+    for kind, spec in _BODY_STYLES.items():
+        body = {"font": DEFAULT_FONT, "alignment": Alignment(horizontal="center"), "border": THIN_BORDER}
+        body.update(spec)
+        specs[kind] = body
+        specs[f"{kind}_zero"] = dict(body, number_format=";;;")
+        specs[f"{kind}_cf"] = dict(body, number_format=ZERO_HIDDEN_FORMAT)
+    return specs
+
+def _register_styles(wb):
+    """Adds the payroll NamedStyles to wb; returns style key -> style name."""
+    names = {}
+    for key, spec in _style_specs().items():
+        names[key] = f"Payroll {key}"
+        wb.add_named_style(NamedStyle(name=names[key], **spec))
+    return names
+
+# One worksheet cell as produced by _payroll_rows
+_Cell = namedtuple("_Cell", "value style")
+
+# Formula cell value that also carries its precomputed result
+_Cached = namedtuple("_Cached", "formula result")
+
+def _with_result(value, result, cell_values):
+    """Pairs a formula with its result ("cached") or replaces it ("values")."""
+    if not (isinstance(value, str) and value.startswith("=")):
+        return value
+    if cell_values == "values":
+        return result
+    return _Cached(value, result)
+
+def _body_cell(value, kind):
+    # Formatting: Hide zeros for cleaner look
+    return _Cell(value, f"{kind}_zero" if value == 0 else kind)
+
+# Sheet-level conditional format: an Excel formula relative to the top-left
+# cell of the 1-based column span, over every data row
+_Rule = namedtuple("_Rule", "first_col last_col formula style")
+
+def _conditional_rules(final_df, relay_cols, adp_cols):
+    """
+    The per-row highlights of _payroll_rows as range rules: Solo5 relay days
+    and counts, override pay and anomaly driver names.
+    """
+    base = len([c for c in final_df.columns if not c.startswith(("R_", "A_"))])
+    relay_start = base + 1
+    adp_start = relay_start + len(relay_cols)
+    calc_start = adp_start + len(adp_cols)
+    rules = []
+
+    def positive(col, threshold=0):
+        cell = f"{get_column_letter(col)}2"
+        return f"AND(ISNUMBER({cell}),{cell}>{threshold})"
+
+    if relay_cols:
+        rules.append(_Rule(relay_start, adp_start - 1, positive(relay_start, 30), "solo5"))
+    rules.append(_Rule(calc_start + 3, calc_start + 4, positive(calc_start + 3), "solo5"))
+    rules.append(_Rule(calc_start + 14, calc_start + 14, positive(calc_start + 14), "override"))
+
+    # Relay hours but no ADP hours
+    if relay_cols:
+        relay_sum = f"SUM(${get_column_letter(relay_start)}2:${get_column_letter(adp_start - 1)}2)"
+        anomaly = f"{relay_sum}>0"
+        if adp_cols:
+            adp_sum = f"SUM(${get_column_letter(adp_start)}2:${get_column_letter(calc_start - 1)}2)"
+            anomaly = f"AND({anomaly},{adp_sum}=0)"
+        rules.append(_Rule(1, 1, anomaly, "anomaly"))
+    return rules
+
+def _rule_range(rule, last_row):
+    return f"{get_column_letter(rule.first_col)}2:{get_column_letter(rule.last_col)}{last_row}"
+
+def _extra_adp_hrs(row_series, relay_week_cols, adp_week_cols):
+    """
+    Extra-load ADP hours for one week. Relay days with hours > 0 are real
+    loads, in date order; loads beyond Switch_After_Load are extra and we
+    add the ADP hours for the same calendar date as each extra relay day.
+    """
+    try:
+        sw_val = int(row_series.get("Switch_After_Load", 0) or 0)
+    except (ValueError, TypeError):
+        sw_val = 0
+    relay_vals = [(c, float(row_series.get(c, 0) or 0)) for c in relay_week_cols]
+    load_days  = [c for c, v in relay_vals if v > 0]
+    if len(load_days) <= sw_val:
+        return 0.0
+    extra_days   = load_days[sw_val:]
+    adp_date_map = {c.replace("A_", ""): c for c in adp_week_cols}
+    total = 0.0
+    for r_col in extra_days:
+        a_col = adp_date_map.get(r_col.replace("R_", ""))
+        if a_col:
+            total += float(row_series.get(a_col, 0) or 0)
+    return round(total, 4)
+
+def _payroll_rows(
+    final_df, relay_cols, adp_cols, override_map,
+    conditional_formatting=False, compact_formulas=False,
+    pay_df=None, cell_values="formulas",
+):
+    """
+    Yields the header row, then one list of _Cell per driver row. With
+    conditional_formatting each column keeps a single style and highlights
+    are left to _conditional_rules. With compact_formulas the calculated
+    columns are filled from per-column templates that use the Rates names.
+    Unless cell_values is "formulas", formula results come from pay_df
+    (compute_pay output for final_df).
+    """
     # Define the calculation columns to be added at the end
     calc_columns = [
         "W1_Relay_Loads", "W2_Relay_Loads", "Total_Relay_Loads",
@@ -322,19 +498,12 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
     # Combine all headers
     base_headers = [c for c in final_df.columns if not c.startswith(("R_", "A_"))]
     headers = base_headers + relay_display + adp_display + calc_columns
-    ws.append(headers)
+    yield [_Cell(h, "header") for h in headers]
     
     # Create a mapping of Header Name -> Column Letter for formulas
     col_map = {name: get_column_letter(idx) for idx, name in enumerate(headers, 1)}
     def gcl(name): return col_map.get(name)
 
-    # Apply Header Styling
-    for cell in ws[1]:
-        cell.fill = HEADER_FILL
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = THIN_BORDER
-
     # --- Helper functions for TIER_SWITCH formula building ---
     # Defined once outside the row loop for efficiency.
 
@@ -361,32 +530,12 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
         extra       = f"IF({sw_type_cell}=\"FIXED\",{extra_fixed},{extra_hrly})"
         return f"IF({wk_lds}<={sw_at_cell},{base},{base}+{extra})"
 
-    # Iterate through Data Rows
-    for row_idx, row_values in enumerate(final_df.values, start=2):
-        row_num = str(row_idx)
-        driver_name = str(row_values[0])
-        
-        # 1. Write the base data from the DataFrame
-        for c_idx, val in enumerate(row_values):
-            cell = ws.cell(row_idx, c_idx + 1, val)
-            
-            # Formatting: Hide zeros for cleaner look
-            if val == 0:
-                cell.number_format = ';;;' 
-            
-            # Apply color coding based on column category
-            header = headers[c_idx]
-            if c_idx == 0: # Driver Name Column
-                cell.fill = DRIVER_FILL
-            elif header in relay_display:
-                cell.fill = RELAY_FILL
-            elif header in adp_display:
-                cell.fill = ADP_FILL
-            
-            cell.border = THIN_BORDER
-            cell.alignment = Alignment(horizontal="center")
-
-        col_ptr = len(row_values) + 1
+    def _legacy_calc(row_num, solo5_count, solo5_pay, override_total,
+                     w1_extra_hrs, w2_extra_hrs, driver_in_driverpay):
+        """Calculated cells for one row, with every rate written into the formulas."""
+        # Calculated columns, in calc_columns order
+        calc = [None] * len(calc_columns)
+        col_ptr = len(final_df.columns) + 1
         
         # --- FORMULA SECTION ---
         # 2. Weekly Relay Loads
@@ -402,7 +551,7 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
         w1_start_letter = get_column_letter(relay_start_col)
         w1_end_letter   = get_column_letter(relay_start_col + min(6, len(relay_display) - 1))
         w1_relay_range  = f"{w1_start_letter}{row_num}:{w1_end_letter}{row_num}"
-        ws.cell(row_idx, col_ptr).value = f'=COUNTIF({w1_relay_range}, ">0")'
+        calc[0] = f'=COUNTIF({w1_relay_range}, ">0")'
 
         # W2: next 7 relay columns (indices 7-13)
         w2_relay_val = 0
@@ -412,44 +561,14 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
             w2_relay_range  = f"{w2_start_letter}{row_num}:{w2_end_letter}{row_num}"
             w2_relay_val    = f'=COUNTIF({w2_relay_range}, ">0")'
         
-        ws.cell(row_idx, col_ptr + 1).value = w2_relay_val
-        ws.cell(row_idx, col_ptr + 2).value = f"={gcl('W1_Relay_Loads')}{row_num}+{gcl('W2_Relay_Loads')}{row_num}"
+        calc[1] = w2_relay_val
+        calc[2] = f"={gcl('W1_Relay_Loads')}{row_num}+{gcl('W2_Relay_Loads')}{row_num}"
         col_ptr += 3
 
-        # Build row_series once here — used by Solo5, extra ADP hours, and category detection
-        row_series = dict(zip(final_df.columns, row_values))
-
-        # Solo5 Detection (Python-side):
-        # Any relay date column where hours > 30 = one Solo5 block = $1800 flat.
-        # Multiple Solo5 blocks in the same period each add $1800.
-        solo5_count = sum(
-            1 for c in relay_cols
-            if float(row_series.get(c, 0) or 0) > 30
-        )
-        solo5_pay = solo5_count * 1800
-
-        # Write Solo5_Count and Solo5_Pay cells — colored purple when present
-        SOLO5_FILL = PatternFill("solid", fgColor="9B59B6")  # purple
-
-        solo5_count_cell = ws.cell(row_idx, col_ptr)
-        solo5_pay_cell   = ws.cell(row_idx, col_ptr + 1)
-
+        # Solo5_Count and Solo5_Pay cells — colored purple when present
         if solo5_count > 0:
-            solo5_count_cell.value = solo5_count
-            solo5_count_cell.fill  = SOLO5_FILL
-            solo5_count_cell.font  = Font(bold=True, color="FFFFFF")
-            solo5_pay_cell.value   = solo5_pay
-            solo5_pay_cell.fill    = SOLO5_FILL
-            solo5_pay_cell.font    = Font(bold=True, color="FFFFFF")
-
-        # Also highlight the relay date cells that triggered Solo5 (hours > 30)
-        relay_start_idx = len(base_headers)
-        for i, rc in enumerate(relay_cols):
-            if float(row_series.get(rc, 0) or 0) > 30:
-                relay_cell = ws.cell(row_idx, relay_start_idx + i + 1)
-                relay_cell.fill = SOLO5_FILL
-                relay_cell.font = Font(bold=True, color="FFFFFF")
-
+            calc[3] = solo5_count
+            calc[4] = solo5_pay
         col_ptr += 2
         # ADP columns start immediately after all relay columns.
         adp_start_col = len(base_headers) + len(relay_display) + 1  # 1-based
@@ -458,9 +577,9 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
         w1_adp_start_letter = get_column_letter(adp_start_col)
         w1_adp_end_letter   = get_column_letter(adp_start_col + min(6, len(adp_display) - 1))
         w1_adp_range = f"{w1_adp_start_letter}{row_num}:{w1_adp_end_letter}{row_num}"
-        ws.cell(row_idx, col_ptr).value = f"=SUM({w1_adp_range})"
-        ws.cell(row_idx, col_ptr + 1).value = f"=MIN({gcl('W1 Hours')}{row_num}, 40)"
-        ws.cell(row_idx, col_ptr + 2).value = f"=MAX(0, {gcl('W1 Hours')}{row_num}-40)"
+        calc[5] = f"=SUM({w1_adp_range})"
+        calc[6] = f"=MIN({gcl('W1 Hours')}{row_num}, 40)"
+        calc[7] = f"=MAX(0, {gcl('W1 Hours')}{row_num}-40)"
         col_ptr += 3
 
         # ADP Week 2: next 7 ADP columns
@@ -468,29 +587,23 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
             w2_adp_start_letter = get_column_letter(adp_start_col + 7)
             w2_adp_end_letter   = get_column_letter(adp_start_col + min(13, len(adp_display) - 1))
             w2_adp_range = f"{w2_adp_start_letter}{row_num}:{w2_adp_end_letter}{row_num}"
-            ws.cell(row_idx, col_ptr).value = f"=SUM({w2_adp_range})"
-            ws.cell(row_idx, col_ptr + 1).value = f"=MIN({gcl('W2 Hours')}{row_num}, 40)"
-            ws.cell(row_idx, col_ptr + 2).value = f"=MAX(0, {gcl('W2 Hours')}{row_num}-40)"
+            calc[8] = f"=SUM({w2_adp_range})"
+            calc[9] = f"=MIN({gcl('W2 Hours')}{row_num}, 40)"
+            calc[10] = f"=MAX(0, {gcl('W2 Hours')}{row_num}-40)"
         else:
-            ws.cell(row_idx, col_ptr).value = 0
-            ws.cell(row_idx, col_ptr + 1).value = 0
-            ws.cell(row_idx, col_ptr + 2).value = 0
+            calc[8] = 0
+            calc[9] = 0
+            calc[10] = 0
         col_ptr += 3
 
         # 4. ADP Totals
-        ws.cell(row_idx, col_ptr).value = f"={gcl('W1 Hours')}{row_num}+{gcl('W2 Hours')}{row_num}"
-        ws.cell(row_idx, col_ptr + 1).value = f"={gcl('W1 Regular')}{row_num}+{gcl('W2 Regular')}{row_num}"
-        ws.cell(row_idx, col_ptr + 2).value = f"={gcl('W1 OT')}{row_num}+{gcl('W2 OT')}{row_num}"
+        calc[11] = f"={gcl('W1 Hours')}{row_num}+{gcl('W2 Hours')}{row_num}"
+        calc[12] = f"={gcl('W1 Regular')}{row_num}+{gcl('W2 Regular')}{row_num}"
+        calc[13] = f"={gcl('W1 OT')}{row_num}+{gcl('W2 OT')}{row_num}"
         col_ptr += 3
 
         # 5. Overrides
-        # We find the override total for the specific driver
-        driver_overrides = [v for (d, dt), v in override_map.items() if d.upper() == driver_name.upper()]
-        override_total = sum(driver_overrides)
-        ov_cell = ws.cell(row_idx, col_ptr)
-        ov_cell.value = override_total
-        if override_total > 0:
-            ov_cell.fill = OVERRIDE_FILL
+        calc[14] = override_total
         col_ptr += 1
 
         # 6. Final Pay Logic
@@ -512,37 +625,6 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
         # Fixed tier values: 1 load=350, 2 loads=700, 3 loads=1000
         # For loads > Switch_After_Load the base is capped at the Switch tier value.
         # Extra loads beyond switch: FIXED=+350/load, HOURLY=extra_load_ADP_hrs×24
-
-        # Compute extra-load ADP hours in Python per week.
-        # Relay days with hours > 0 are real loads, sorted chronologically.
-        # Extra loads = those beyond Switch_After_Load threshold.
-        # We look up the ADP hours for the same calendar date as each extra relay day.
-        def _extra_adp_hrs(relay_week_cols, adp_week_cols):
-            try:
-                sw_val = int(row_series.get("Switch_After_Load", 0) or 0)
-            except (ValueError, TypeError):
-                sw_val = 0
-            relay_vals = [(c, float(row_series.get(c, 0) or 0)) for c in relay_week_cols]
-            load_days  = [c for c, v in relay_vals if v > 0]
-            if len(load_days) <= sw_val:
-                return 0.0
-            extra_days   = load_days[sw_val:]
-            adp_date_map = {c.replace("A_", ""): c for c in adp_week_cols}
-            total = 0.0
-            for r_col in extra_days:
-                a_col = adp_date_map.get(r_col.replace("R_", ""))
-                if a_col:
-                    total += float(row_series.get(a_col, 0) or 0)
-            return round(total, 4)
-
-        w1_relay_cols = relay_cols[:7]
-        w2_relay_cols = relay_cols[7:14]
-        w1_adp_cols   = adp_cols[:7]
-        w2_adp_cols   = adp_cols[7:14]
-
-        w1_extra_hrs = _extra_adp_hrs(w1_relay_cols, w1_adp_cols)
-        w2_extra_hrs = _extra_adp_hrs(w2_relay_cols, w2_adp_cols)
-
         w1_tier = _week_tier_formula(w1_lds, sw_at, sw_type, w1_extra_hrs)
         w2_tier = _week_tier_formula(w2_lds, sw_at, sw_type, w2_extra_hrs)
 
@@ -552,10 +634,6 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
         tot_reg = f"{gcl('Total Regular')}{row_num}"
         tot_ot  = f"{gcl('Total OT')}{row_num}"
 
-        # Detect whether this driver has a Category (i.e. exists in DriverPay)
-        driver_category = str(row_series.get("Category", "")).strip()
-        driver_in_driverpay = driver_category != "" and driver_category.lower() != "nan"
-
         if driver_in_driverpay:
             formula = (
                 f"=IF({cat}=\"PER_LOAD\",{tot_lds}*350,"
@@ -570,24 +648,173 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
             # Not in DriverPay — pay purely by ADP hours + any Solo5
             formula = f"={tot_reg}*24+{tot_ot}*36+{solo5_pay}"
 
-        ws.cell(row_idx, col_ptr).value = formula
+        calc[15] = formula
         final_pay_col = get_column_letter(col_ptr)
         col_ptr += 1
 
         # 7. Pay by Hours: Total Regular × 24 + Total OT × 36
         pay_by_hours_col = get_column_letter(col_ptr)
-        ws.cell(row_idx, col_ptr).value = f"={tot_reg}*24+{tot_ot}*36"
+        calc[16] = f"={tot_reg}*24+{tot_ot}*36"
         col_ptr += 1
 
         # 8. Hour Adjustment: (Final Pay - Pay by Hours) / 36
         # = how many extra hours (each worth $36) close the gap.
         # Hidden (blank) for drivers not in DriverPay since their gap is always 0.
         if driver_in_driverpay:
-            ws.cell(row_idx, col_ptr).value = (
-                f"=({final_pay_col}{row_num}-{pay_by_hours_col}{row_num})/36"
-            )
+            calc[17] = f"=({final_pay_col}{row_num}-{pay_by_hours_col}{row_num})/36"
         else:
-            ws.cell(row_idx, col_ptr).value = None  # blank — no adjustment needed
+            calc[17] = None  # blank — no adjustment needed
+
+        return calc
+
+    def _compact_templates():
+        """
+        Calculated-column templates ({r} = row number, {w1x}/{w2x} = extra
+        ADP hours) for drivers in DriverPay and for hours-only drivers.
+        Value columns (Solo5, Override Pay) are None and filled per row.
+        """
+        def ref(name):
+            return f"{gcl(name)}{{r}}"
+
+        def span(start, first, last):
+            return f"{get_column_letter(start + first)}{{r}}:{get_column_letter(start + last)}{{r}}"
+
+        relay_start_col = len(base_headers) + 1
+        adp_start_col = relay_start_col + len(relay_display)
+        t = [None] * len(calc_columns)
+        t[0] = f'=COUNTIF({span(relay_start_col, 0, min(6, len(relay_display) - 1))},">0")'
+        t[1] = 0
+        if len(relay_display) > 7:
+            t[1] = f'=COUNTIF({span(relay_start_col, 7, min(13, len(relay_display) - 1))},">0")'
+        t[2] = f"={ref('W1_Relay_Loads')}+{ref('W2_Relay_Loads')}"
+        t[5] = f"=SUM({span(adp_start_col, 0, min(6, len(adp_display) - 1))})"
+        t[6] = f"=MIN({ref('W1 Hours')},WeekHours)"
+        t[7] = f"=MAX(0,{ref('W1 Hours')}-WeekHours)"
+        t[8] = t[9] = t[10] = 0
+        if len(adp_display) > 7:
+            t[8] = f"=SUM({span(adp_start_col, 7, min(13, len(adp_display) - 1))})"
+            t[9] = f"=MIN({ref('W2 Hours')},WeekHours)"
+            t[10] = f"=MAX(0,{ref('W2 Hours')}-WeekHours)"
+        t[11] = f"={ref('W1 Hours')}+{ref('W2 Hours')}"
+        t[12] = f"={ref('W1 Regular')}+{ref('W2 Regular')}"
+        t[13] = f"={ref('W1 OT')}+{ref('W2 OT')}"
+        t[16] = f"={ref('Total Regular')}*RegRate+{ref('Total OT')}*OtRate"
+
+        # Not in DriverPay — pay purely by ADP hours + any Solo5
+        hours = list(t)
+        hours[15] = f"={ref('Pay by Hours')}+{ref('Solo5_Pay')}"
+
+        # Same tiers as _week_tier_formula: SUMIF finds the tier for the
+        # (capped) load count exactly and gives 0 when there is none
+        cat, sw, tot_lds = ref("Category"), ref("Switch_After_Load"), ref("Total_Relay_Loads")
+        def tier(wk_lds, extra_hrs):
+            extra = f"IF({ref('Switch_Type')}=\"FIXED\",({wk_lds}-{sw})*LoadPay,{{{extra_hrs}}}*RegRate)"
+            return f"SUMIF(TierLoads,MIN({wk_lds},{sw},{max(TIER_PAY)}),TierPay)+IF({wk_lds}>{sw},{extra},0)"
+        dp = list(t)
+        dp[15] = (
+            f"=IF({cat}=\"PER_LOAD\",{tot_lds}*LoadPay,"
+            f"IF({cat}=\"TARGET\",IF({tot_lds}>={ref('Target_Load')},{ref('Package_Amount')},{tot_lds}*LoadPay),"
+            f"IF({cat}=\"TIER_SWITCH\","
+            f"{tier(ref('W1_Relay_Loads'), 'w1x')}+{tier(ref('W2_Relay_Loads'), 'w2x')},"
+            f"{ref('Total ADP Hours')}*RegRate)))"
+            f"+{ref('Override Pay')}+{ref('Solo5_Pay')}"
+        )
+        dp[17] = f"=({ref('Final Pay')}-{ref('Pay by Hours')})/OtRate"
+        return dp, hours
+
+    if compact_formulas:
+        templates_dp, templates_hours = _compact_templates()
+
+    ov_totals = override_totals(override_map)
+
+    # Style kind of each DataFrame column
+    kinds = []
+    for c_idx, header in enumerate(headers[:len(final_df.columns)]):
+        # Apply color coding based on column category
+        kind = "data"
+        if c_idx == 0: # Driver Name Column
+            kind = "driver"
+        elif header in relay_display:
+            kind = "relay"
+        elif header in adp_display:
+            kind = "adp"
+        kinds.append(kind)
+    cf_kinds = [f"{kind}_cf" for kind in kinds]
+
+    if cell_values != "formulas":
+        pay_rows = pay_df[PAY_COLUMNS].to_numpy(dtype=float).tolist()
+
+    # Iterate through Data Rows
+    for row_idx, row_values in enumerate(final_df.values, start=2):
+        row_num = str(row_idx)
+        driver_name = str(row_values[0])
+        
+        # 1. Base data from the DataFrame
+        if conditional_formatting:
+            cells = [_Cell(val, style) for val, style in zip(row_values, cf_kinds)]
+        else:
+            cells = [_body_cell(val, kind) for val, kind in zip(row_values, kinds)]
+
+        # Build row_series once here — used by Solo5, extra ADP hours, and category detection
+        row_series = dict(zip(final_df.columns, row_values))
+
+        # Solo5 Detection (Python-side):
+        # Any relay date column where hours > 30 = one Solo5 block = $1800 flat.
+        # Multiple Solo5 blocks in the same period each add $1800.
+        solo5_count = sum(
+            1 for c in relay_cols
+            if float(row_series.get(c, 0) or 0) > 30
+        )
+        solo5_pay = solo5_count * 1800
+
+        # Also highlight the relay date cells that triggered Solo5 (hours > 30)
+        relay_start_idx = len(base_headers)
+        if solo5_count > 0 and not conditional_formatting:
+            for i, rc in enumerate(relay_cols):
+                if float(row_series.get(rc, 0) or 0) > 30:
+                    cells[relay_start_idx + i] = _body_cell(cells[relay_start_idx + i].value, "solo5")
+
+        # Per-driver override totals are indexed once before the row loop
+        override_total = ov_totals.get(driver_name.upper(), 0)
+
+        # Extra-load ADP hours for HOURLY tier switches, per week
+        w1_extra_hrs = _extra_adp_hrs(row_series, relay_cols[:7], adp_cols[:7])
+        w2_extra_hrs = _extra_adp_hrs(row_series, relay_cols[7:14], adp_cols[7:14])
+
+        # Detect whether this driver has a Category (i.e. exists in DriverPay)
+        driver_category = str(row_series.get("Category", "")).strip()
+        driver_in_driverpay = driver_category != "" and driver_category.lower() != "nan"
+
+        if compact_formulas:
+            calc = [
+                t.format(r=row_num, w1x=w1_extra_hrs, w2x=w2_extra_hrs) if isinstance(t, str) else t
+                for t in (templates_dp if driver_in_driverpay else templates_hours)
+            ]
+            if solo5_count > 0:
+                calc[3] = solo5_count
+                calc[4] = solo5_pay
+            calc[14] = override_total
+        else:
+            calc = _legacy_calc(row_num, solo5_count, solo5_pay, override_total,
+                                w1_extra_hrs, w2_extra_hrs, driver_in_driverpay)
+
+        if cell_values != "formulas":
+            calc = [
+                _with_result(v, result, cell_values)
+                for v, result in zip(calc, pay_rows[row_idx - 2])
+            ]
+
+        if conditional_formatting:
+            yield cells + [_Cell(v, "calc_cf") for v in calc]
+            continue
+
+        # Formatting for the added calculation columns
+        calc_cells = [_body_cell(v, "calc") for v in calc]
+        if solo5_count > 0:
+            calc_cells[3] = _body_cell(solo5_count, "solo5")
+            calc_cells[4] = _body_cell(solo5_pay, "solo5")
+        if override_total > 0:
+            calc_cells[14] = _body_cell(override_total, "override")
 
         # --- ANOMALY DETECTION ---
         # If Relay hours exist but ADP hours are 0, highlight driver name
@@ -600,21 +827,219 @@ def create_excel(final_df, relay_cols, adp_cols, override_map):
         adp_sum = sum([v for v in row_values[adp_start_idx:adp_end_idx] if isinstance(v, (int, float))])
         
         if relay_sum > 0 and adp_sum == 0:
-            ws.cell(row_idx, 1).fill = ANOMALY_FILL
+            cells[0] = _body_cell(cells[0].value, "anomaly")
 
-        # Formatting for the added calculation columns
-        for c in range(len(row_values) + 1, col_ptr + 1):
-            cell = ws.cell(row_idx, c)
-            cell.border = THIN_BORDER
-            cell.alignment = Alignment(horizontal="center")
-            if cell.value == 0:
-                cell.number_format = ';;;'
+        yield cells + calc_cells
 
+def _set_columns(ws, n_cols, rules):
     # Auto-adjust column widths for readability
-    for col in ws.columns:
-        ws.column_dimensions[col[0].column_letter].width = 16
+    for col_idx in range(1, n_cols + 1):
+        dim = ws.column_dimensions[get_column_letter(col_idx)]
+        dim.width = COLUMN_WIDTH
+        if rules is not None:
+            dim.number_format = ZERO_HIDDEN_FORMAT
+
+def _add_openpyxl_rules(ws, rules, last_row):
+    """Adds the conditional formats of _conditional_rules over rows 2..last_row."""
+    if last_row < 2:
+        return
+    for rule in rules:
+        spec = _BODY_STYLES[rule.style]
+        ws.conditional_formatting.add(
+            _rule_range(rule, last_row),
+            FormulaRule(formula=[rule.formula], fill=spec.get("fill"), font=spec.get("font")),
+        )
 
-    out = io.BytesIO()
+def _add_openpyxl_rates(wb, rates):
+    """Appends the hidden Rates sheet and its defined names."""
+    rows, names = rates
+    ws = wb.create_sheet(RATES_SHEET)
+    ws.sheet_state = "hidden"
+    for row in rows:
+        ws.append(row)
+    for name, ref in names.items():
+        wb.defined_names[name] = DefinedName(name, attr_text=ref)
+
+def _write_full(rows, out, rules=None, rates=None):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Payroll"
+    styles = _register_styles(wb)
+    n_cols = 0
+    row_idx = 0
+    for row_idx, row in enumerate(rows, start=1):
+        for col_idx, spec in enumerate(row, start=1):
+            ws.cell(row_idx, col_idx, spec.value).style = styles[spec.style]
+        n_cols = max(n_cols, len(row))
+
+    _set_columns(ws, n_cols, rules)
+    if rules is not None:
+        _add_openpyxl_rules(ws, rules, row_idx)
+    if rates is not None:
+        _add_openpyxl_rates(wb, rates)
+    wb.save(out)
+
+def _write_streaming(rows, out, rules=None, rates=None):
+    """
+    write_only workbook: each row is serialized as soon as it is appended,
+    so memory stays flat however many drivers and date columns there are.
+    Column widths must be declared before the first row; conditional
+    formats are only written on save, once the row count is known.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Payroll")
+    styles = _register_styles(wb)
+    header = next(rows)
+    _set_columns(ws, len(header), rules)
+
+    def _cells(row):
+        for spec in row:
+            cell = WriteOnlyCell(ws, value=spec.value)
+            cell.style = styles[spec.style]
+            yield cell
+
+    ws.append(list(_cells(header)))
+    last_row = 1
+    for last_row, row in enumerate(rows, start=2):
+        ws.append(list(_cells(row)))
+    if rules is not None:
+        _add_openpyxl_rules(ws, rules, last_row)
+    if rates is not None:
+        _add_openpyxl_rates(wb, rates)
     wb.save(out)
+
+def _xlsxwriter_format(spec):
+    """Translates a NamedStyle spec from _style_specs into xlsxwriter format properties."""
+    props = {}
+    if "fill" in spec:
+        props["bg_color"] = f"#{spec['fill'].fgColor.rgb[-6:]}"
+    font = spec.get("font")
+    if font is not None:
+        props["bold"] = bool(font.b)
+        if font.color is not None and font.color.type == "rgb":
+            props["font_color"] = f"#{font.color.rgb[-6:]}"
+    alignment = spec.get("alignment")
+    if alignment is not None:
+        if alignment.horizontal:
+            props["align"] = alignment.horizontal
+        if alignment.vertical == "center":
+            props["valign"] = "vcenter"
+    if "border" in spec:
+        props["border"] = 1  # thin on all four sides
+    if "number_format" in spec:
+        props["num_format"] = spec["number_format"]
+    return props
+
+def _write_xlsxwriter(rows, out, rules=None, rates=None, cached_results=False):
+    """
+    xlsxwriter in constant_memory mode: rows are flushed to disk as soon as
+    the next one starts, so only the current row is ever held in memory.
+    """
+    if xlsxwriter is None:
+        raise ImportError("xlsxwriter is not installed")
+    wb = xlsxwriter.Workbook(out, {"constant_memory": True, "in_memory": False})
+    if cached_results:
+        # Trust the stored results instead of forcing a full recalculation on open
+        wb.set_calc_mode("auto", calc_id=EXCEL_CALC_ID)
+        wb.calc_on_load = False
+    ws = wb.add_worksheet("Payroll")
+    formats = {key: wb.add_format(_xlsxwriter_format(spec)) for key, spec in _style_specs().items()}
+
+    header = next(rows)
+    # openpyxl stores COLUMN_WIDTH as the raw file width; xlsxwriter's set_column
+    # adds cell padding, so size in pixels (7 px per unit at Calibri 11) to match
+    column_format = None
+    if rules is not None:
+        column_format = wb.add_format({"num_format": ZERO_HIDDEN_FORMAT})
+    ws.set_column_pixels(0, len(header) - 1, COLUMN_WIDTH * 7, column_format)
+    row_idx = 0
+    for row_idx, row in enumerate(itertools.chain([header], rows)):
+        for col_idx, spec in enumerate(row):
+            value = spec.value
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                ws.write_blank(row_idx, col_idx, None, formats[spec.style])
+            elif isinstance(value, _Cached):
+                ws.write_formula(row_idx, col_idx, value.formula, formats[spec.style], value.result)
+            else:
+                ws.write(row_idx, col_idx, value, formats[spec.style])
+
+    # Conditional formats are kept apart from the row data, so adding them
+    # after the rows were flushed is fine
+    if rules and row_idx:
+        for rule in rules:
+            spec = _BODY_STYLES[rule.style]
+            ws.conditional_format(_rule_range(rule, row_idx + 1), {
+                "type": "formula",
+                "criteria": f"={rule.formula}",
+                "format": wb.add_format(_xlsxwriter_format(spec)),
+            })
+
+    if rates is not None:
+        rate_rows, names = rates
+        rates_ws = wb.add_worksheet(RATES_SHEET)
+        rates_ws.hide()
+        for row_idx, row in enumerate(rate_rows):
+            for col_idx, value in enumerate(row):
+                if value is not None:
+                    rates_ws.write(row_idx, col_idx, value)
+        for name, ref in names.items():
+            wb.define_name(name, f"={ref}")
+    wb.close()
+
+def create_excel(
+    final_df, relay_cols, adp_cols, override_map,
+    streaming=False, backend="openpyxl", conditional_formatting=False,
+    compact_formulas=False, cell_values="formulas", pay_df=None,
+    compress_level=None, shared_strings=None, prune_styles=False,
+):
+    """
+    Builds the payroll workbook. backend picks the writer: "openpyxl"
+    (streaming=True uses its write_only mode — same cells and styles, flat
+    memory) or "xlsxwriter" (constant_memory mode). All produce the same
+    layout, values, formulas and formatting.
+
+    conditional_formatting=True hides zeros through the column number
+    format and writes Solo5, override and anomaly highlights as sheet-level
+    conditional formats instead of styling each cell, so they follow values
+    edited later in Excel.
+
+    compact_formulas=True keeps the tier and rate tables on a hidden Rates
+    sheet behind defined names and fills the calculated columns from
+    per-column templates, giving shorter formulas with the same results.
+
+    cell_values="cached" stores each formula with its result from
+    compute_pay (pass pay_df if already computed), so the workbook opens
+    without a recalculation and readers like pandas see the totals;
+    "values" writes the results alone, for archiving.
+
+    The finished package can be rewritten for size (see tune_package):
+    compress_level 0-9 for the zip, shared_strings=True/False to store
+    text in one shared table or inline in the cells (None keeps the
+    writer's choice) and prune_styles to drop unused style records. This
+    pass holds the sheet XML in memory once, after the rows are written.
+    """
+    if cell_values not in CELL_VALUE_MODES:
+        raise ValueError(f"Unknown cell values mode: {cell_values}")
+    if cell_values == "cached" and backend != "xlsxwriter":
+        raise ValueError("Cached formula results need the xlsxwriter backend")
+    if cell_values != "formulas" and pay_df is None:
+        pay_df = compute_pay(final_df, relay_cols, adp_cols, override_map)
+
+    rows = _payroll_rows(
+        final_df, relay_cols, adp_cols, override_map,
+        conditional_formatting, compact_formulas, pay_df, cell_values,
+    )
+    rules = _conditional_rules(final_df, relay_cols, adp_cols) if conditional_formatting else None
+    # Plain values never refer to the Rates names
+    rates = _rates_rows() if compact_formulas and cell_values != "values" else None
+    out = io.BytesIO()
+    if backend == "xlsxwriter":
+        _write_xlsxwriter(rows, out, rules, rates, cached_results=cell_values == "cached")
+    elif backend == "openpyxl":
+        (_write_streaming if streaming else _write_full)(rows, out, rules, rates)
+    else:
+        raise ValueError(f"Unknown Excel backend: {backend}")
+    if compress_level is not None or shared_strings is not None or prune_styles:
+        out = io.BytesIO(tune_package(out.getvalue(), compress_level, shared_strings, prune_styles))
     out.seek(0)
-    return out, []
\ No newline at end of file
+    return out, []
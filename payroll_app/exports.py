@@ -0,0 +1,37 @@
+"""Machine-readable exports of the payroll dataset (one row per driver)."""
+
+import io
+
+# format -> (file extension, MIME type)
+TABLE_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "csv": ("csv", "text/csv"),
+}
+
+try:
+    import pyarrow  # noqa: F401  (pandas' Parquet writer)
+except ImportError:
+    del TABLE_FORMATS["parquet"]
+
+
+def payroll_table(final_df, pay_df):
+    """final_df with the computed pay columns (compute_pay output) appended."""
+    return final_df.join(pay_df)
+
+
+def export_table(table, fmt):
+    """Serializes the payroll table straight from the DataFrame; returns bytes."""
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"Unknown or unavailable table format: {fmt}")
+    buf = io.BytesIO()
+    if fmt == "csv":
+        table.to_csv(buf, index=False)
+    else:
+        try:
+            table.to_parquet(buf, index=False)
+        except (TypeError, ValueError):
+            # Parquet needs one type per column; store mixed text/number columns as text
+            buf = io.BytesIO()
+            text = {c: "string" for c in table.columns if table[c].dtype == object}
+            table.astype(text).to_parquet(buf, index=False)
+    return buf.getvalue()
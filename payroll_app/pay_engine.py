@@ -0,0 +1,154 @@
+"""Vectorized Python mirror of the payroll workbook's calculated columns."""
+
+import numpy as np
+import pandas as pd
+
+from payroll_app.config import OT_RATE, REG_RATE
+from payroll_app.processing import override_totals
+
+LOAD_PAY = 350
+TIER_PAY = {1: 350, 2: 700, 3: 1000}  # 3 or more loads pay the top tier
+SOLO5_HOURS = 30
+SOLO5_PAY = 1800
+WEEK_HOURS = 40
+
+PAY_COLUMNS = [
+    "W1_Relay_Loads", "W2_Relay_Loads", "Total_Relay_Loads",
+    "Solo5_Count", "Solo5_Pay",
+    "W1 Hours", "W1 Regular", "W1 OT",
+    "W2 Hours", "W2 Regular", "W2 OT",
+    "Total ADP Hours", "Total Regular", "Total OT",
+    "Override Pay", "Final Pay", "Pay by Hours", "Hour Adjustment",
+]
+
+
+def _numeric(final_df, cols):
+    """(rows x cols) float matrix; blanks and text count as 0 like in Excel."""
+    if not cols:
+        return np.zeros((len(final_df), 0))
+    return final_df[cols].apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=float)
+
+
+def _column(final_df, name, default=np.nan):
+    if name in final_df.columns:
+        return final_df[name]
+    return pd.Series(default, index=final_df.index)
+
+
+def _tier_base(loads, switch_at):
+    m = np.minimum(loads, switch_at)
+    return np.select(
+        [m == 1, m == 2, m >= 3],
+        [TIER_PAY[1], TIER_PAY[2], TIER_PAY[3]],
+        default=0,
+    )
+
+
+def _extra_adp_hours(relay_week, adp_week, relay_week_cols, adp_week_cols, switch_int):
+    """
+    ADP hours worked on the relay load days beyond Switch_After_Load, per row.
+    Load days are relay days with hours > 0 in date order; each extra day is
+    matched to the ADP column for the same calendar date.
+    """
+    adp_index = {c.replace("A_", ""): i for i, c in enumerate(adp_week_cols)}
+    aligned = np.zeros_like(relay_week)
+    for j, r_col in enumerate(relay_week_cols):
+        i = adp_index.get(r_col.replace("R_", ""))
+        if i is not None:
+            aligned[:, j] = adp_week[:, i]
+    is_load = relay_week > 0
+    extra_day = is_load & (np.cumsum(is_load, axis=1) > switch_int[:, None])
+    return np.round((aligned * extra_day).sum(axis=1), 4)
+
+
+def _week_tier_pay(loads, switch_at, switch_fixed, extra_hrs):
+    base = _tier_base(loads, switch_at)
+    extra = np.where(switch_fixed, (loads - switch_at) * LOAD_PAY, extra_hrs * REG_RATE)
+    return np.where(loads <= switch_at, base, base + extra)
+
+
+def compute_pay(final_df, relay_cols, adp_cols, override_map):
+    """
+    Computes every calculated workbook column for all drivers at once.
+    Returns a DataFrame indexed like final_df with PAY_COLUMNS, using the
+    same rules as the Excel formulas written by create_excel.
+    """
+    relay = _numeric(final_df, relay_cols)
+    adp = _numeric(final_df, adp_cols)
+    w1_relay, w2_relay = relay[:, :7], relay[:, 7:14]
+    w1_adp, w2_adp = adp[:, :7], adp[:, 7:14]
+
+    # Relay loads and Solo5 blocks (any relay day over 30h)
+    w1_loads = (w1_relay > 0).sum(axis=1)
+    w2_loads = (w2_relay > 0).sum(axis=1)
+    total_loads = w1_loads + w2_loads
+    solo5_count = (relay > SOLO5_HOURS).sum(axis=1)
+    solo5_pay = solo5_count * SOLO5_PAY
+
+    # ADP hours split at 40h per week
+    w1_hours = w1_adp.sum(axis=1)
+    w2_hours = w2_adp.sum(axis=1)
+    w1_reg, w1_ot = np.minimum(w1_hours, WEEK_HOURS), np.maximum(0, w1_hours - WEEK_HOURS)
+    w2_reg, w2_ot = np.minimum(w2_hours, WEEK_HOURS), np.maximum(0, w2_hours - WEEK_HOURS)
+    total_hours = w1_hours + w2_hours
+    total_reg = w1_reg + w2_reg
+    total_ot = w1_ot + w2_ot
+
+    totals = override_totals(override_map)
+    override_pay = final_df.iloc[:, 0].astype(str).str.upper().map(totals).fillna(0).to_numpy(dtype=float)
+
+    # DriverPay terms. Excel compares text case-insensitively and reads blanks as 0.
+    category_raw = _column(final_df, "Category")
+    category = category_raw.astype(str).str.upper().to_numpy()
+    stripped = category_raw.astype(str).str.strip()
+    in_driverpay = ((stripped != "") & (stripped.str.lower() != "nan") & category_raw.notna()).to_numpy()
+    package = pd.to_numeric(_column(final_df, "Package_Amount"), errors="coerce").fillna(0).to_numpy()
+    target = pd.to_numeric(_column(final_df, "Target_Load"), errors="coerce").fillna(0).to_numpy()
+    switch_at = pd.to_numeric(_column(final_df, "Switch_After_Load"), errors="coerce").fillna(0).to_numpy()
+    switch_fixed = _column(final_df, "Switch_Type").astype(str).str.upper().to_numpy() == "FIXED"
+    switch_int = np.trunc(switch_at)
+
+    w1_extra = _extra_adp_hours(w1_relay, w1_adp, relay_cols[:7], adp_cols[:7], switch_int)
+    w2_extra = _extra_adp_hours(w2_relay, w2_adp, relay_cols[7:14], adp_cols[7:14], switch_int)
+    tier_pay = (
+        _week_tier_pay(w1_loads, switch_at, switch_fixed, w1_extra)
+        + _week_tier_pay(w2_loads, switch_at, switch_fixed, w2_extra)
+    )
+
+    category_pay = np.select(
+        [category == "PER_LOAD", category == "TARGET", category == "TIER_SWITCH"],
+        [
+            total_loads * LOAD_PAY,
+            np.where(total_loads >= target, package, total_loads * LOAD_PAY),
+            tier_pay,
+        ],
+        default=total_hours * REG_RATE,
+    )
+    pay_by_hours = total_reg * REG_RATE + total_ot * OT_RATE
+    final_pay = np.where(
+        in_driverpay,
+        category_pay + override_pay + solo5_pay,
+        pay_by_hours + solo5_pay,
+    )
+    hour_adjustment = np.where(in_driverpay, (final_pay - pay_by_hours) / OT_RATE, np.nan)
+
+    return pd.DataFrame({
+        "W1_Relay_Loads": w1_loads,
+        "W2_Relay_Loads": w2_loads,
+        "Total_Relay_Loads": total_loads,
+        "Solo5_Count": solo5_count,
+        "Solo5_Pay": solo5_pay,
+        "W1 Hours": w1_hours,
+        "W1 Regular": w1_reg,
+        "W1 OT": w1_ot,
+        "W2 Hours": w2_hours,
+        "W2 Regular": w2_reg,
+        "W2 OT": w2_ot,
+        "Total ADP Hours": total_hours,
+        "Total Regular": total_reg,
+        "Total OT": total_ot,
+        "Override Pay": override_pay,
+        "Final Pay": final_pay,
+        "Pay by Hours": pay_by_hours,
+        "Hour Adjustment": hour_adjustment,
+    }, index=final_df.index)[PAY_COLUMNS]
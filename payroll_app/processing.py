@@ -1,9 +1,29 @@
 import io
+import multiprocessing
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 from rapidfuzz import fuzz, process
 
-def read_flexible_file(content, filename):
-    """Reads CSV or Excel files from bytes."""
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"  # multi-threaded parser, releases the GIL
+except ImportError:
+    CSV_ENGINE = "c"
+
+def _cached(cache, namespace, parse, content, *extra):
+    """Runs parse(content), going through the frame cache when one is given."""
+    if cache is None:
+        return parse(content)
+    key = cache.key(namespace, content, *extra)
+    return cache.get_or_compute(key, lambda: parse(content))
+
+def _read_flexible_file(content, filename):
     try:
         if filename.lower().endswith(".csv"):
             return pd.read_csv(io.BytesIO(content))
@@ -14,25 +34,95 @@ def read_flexible_file(content, filename):
         return None
     return None
 
-def get_fuzzy_name_mapper(target_names, threshold=70):
-    """Maps names to ADP Master list using fuzzy matching."""
-    def _match(name):
-        if pd.isna(name) or str(name).strip() == "":
-            return name
-        name_str = str(name).upper().strip()
-        candidate = process.extractOne(name_str, target_names, scorer=fuzz.token_sort_ratio)
-        if candidate and candidate[1] >= threshold:
-            return candidate[0]
-        return name_str 
+def read_flexible_file(content, filename, cache=None):
+    """Reads CSV or Excel files from bytes."""
+    ext = filename.lower().rsplit(".", 1)[-1]
+    return _cached(cache, "file", lambda raw: _read_flexible_file(raw, filename), content, ext)
+
+def _best_matches(keys, target_names, workers=1):
+    """Scores keys against the roster in one cdist call -> [(candidate, score)]."""
+    if not target_names:
+        return [(None, 0.0)] * len(keys)
+    scores = process.cdist(
+        keys, target_names,
+        scorer=fuzz.token_sort_ratio, dtype=np.float64, workers=workers,
+    )
+    # argmax keeps the first best candidate, same as extractOne
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(keys)), best]
+    return [(target_names[i], float(sc)) for i, sc in zip(best, best_scores)]
+
+def get_fuzzy_name_mapper(target_names, threshold=70, workers=1, alias_store=None):
+    """
+    Maps names to ADP Master list using fuzzy matching.
+    The returned mapper takes a Series of names, scores every distinct name
+    against the roster in one cdist call and maps the matches back.
+    workers=-1 spreads the scoring over all CPU cores. With an alias_store,
+    only names it has not already resolved for this roster are scored.
+    """
+    target_names = list(target_names)
+
+    def _score(keys, targets):
+        return _best_matches(keys, targets, workers)
+
+    def _match(names):
+        names = pd.Series(names)
+        blank = names.isna() | (names.astype(str).str.strip() == "")
+        keys = names.astype(str).str.upper().str.strip()
+
+        unique_keys = keys[~blank].unique().tolist()
+        if alias_store is not None:
+            matches = alias_store.resolve(unique_keys, target_names, _score)
+        else:
+            matches = dict(zip(unique_keys, _score(unique_keys, target_names)))
+
+        resolved = {
+            key: cand if cand is not None and score >= threshold else key
+            for key, (cand, score) in matches.items()
+        }
+        return keys.map(resolved).where(~blank, names)
     return _match
 
-def process_adp(contents):
+# Only these ADP columns feed the summary; everything else is skipped at read time
+ADP_DTYPES = {"Payroll Name": str, "Pay Date": str, "Hours": "float64"}
+
+def _read_adp_file(raw):
+    """Reads one ADP CSV, pruned to ADP_DTYPES. Returns None if it isn't an ADP export."""
+    header = pd.read_csv(io.BytesIO(raw), nrows=0).columns
+    if "Payroll Name" not in header:
+        return None
+    usecols = [c for c in ADP_DTYPES if c in header]
+    try:
+        return _read_adp_csv(raw, usecols, CSV_ENGINE)
+    except pd.errors.ParserError:
+        if CSV_ENGINE == "c":
+            raise
+        # pyarrow rejects short or ragged rows (e.g. a "Total,," footer)
+        # that the C parser pads with NaN
+        return _read_adp_csv(raw, usecols, "c")
+
+def _read_adp_csv(raw, usecols, engine):
+    dtype = {c: ADP_DTYPES[c] for c in usecols}
+    try:
+        return pd.read_csv(io.BytesIO(raw), usecols=usecols, dtype=dtype, engine=engine)
+    except pd.errors.ParserError:
+        raise
+    except ValueError:
+        # Non-numeric text in Hours — read it as text and let process_adp coerce it
+        dtype["Hours"] = str
+        return pd.read_csv(io.BytesIO(raw), usecols=usecols, dtype=dtype, engine=engine)
+
+def process_adp(contents, max_workers=None, cache=None):
     """Processes ADP CSV files into a Daily Hours Summary."""
-    dfs = []
-    for raw in contents:
-        df = pd.read_csv(io.BytesIO(raw))
-        if "Payroll Name" in df.columns:
-            dfs.append(df)
+    def _read(raw):
+        return _cached(cache, "adp", _read_adp_file, raw)
+
+    if len(contents) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            parsed = list(pool.map(_read, contents))
+    else:
+        parsed = [_read(raw) for raw in contents]
+    dfs = [df for df in parsed if df is not None]
             
     if not dfs:
         return pd.DataFrame(columns=["Driver", "Date", "Hours"]), None
@@ -45,91 +135,218 @@ def process_adp(contents):
     grouped = df.groupby(["Driver", "Date"], as_index=False)["Hours"].sum()
     return grouped, None
 
-def process_relay(contents):
-    """Processes Relay CSV files and calculates trip duration."""
-    all_rows = []
-    for raw in contents:
-        df = pd.read_csv(io.BytesIO(raw))
-
-        # Standardize headers (strip extra spaces)
-        df.columns = [c.strip() for c in df.columns]
-
-        s1_act_date = "Stop 1  Actual Arrival Date"
-        s1_act_time = "Stop 1  Actual Arrival Time"
-        s2_arr_date = "Stop 2  Actual Arrival Date"
-        s2_arr_time = "Stop 2  Actual Arrival Time"
-        s2_dep_date = "Stop 2 Actual Departure Date"
-        s2_dep_time = "Stop 2 Actual Departure Time"
-        s1_dep_date = "Stop 1 Actual Departure Date"
-        s1_dep_time = "Stop 1 Actual Departure Time"
-        p1_date     = "Stop 1 Planned Arrival Date"
-        p1_time     = "Stop 1 Planned Arrival Time"
-
-        df["Stop1_Actual"]  = pd.to_datetime(df[s1_act_date].astype(str) + " " + df[s1_act_time].astype(str), errors="coerce")
-        df["Stop1_Planned"] = pd.to_datetime(df[p1_date].astype(str)     + " " + df[p1_time].astype(str),     errors="coerce")
-
-        # Best end time per row — cascading fallback:
-        # 1st choice: Stop 2 Actual Arrival (most accurate)
-        # 2nd choice: Stop 2 Actual Departure (if arrival missing)
-        # 3rd choice: Stop 1 Actual Departure (last resort)
-        df["Stop2_Arrival"] = pd.to_datetime(df[s2_arr_date].astype(str) + " " + df[s2_arr_time].astype(str), errors="coerce")
-        df["Stop2_Depart"]  = pd.to_datetime(df[s2_dep_date].astype(str) + " " + df[s2_dep_time].astype(str), errors="coerce")
-        df["Stop1_Depart"]  = pd.to_datetime(df[s1_dep_date].astype(str) + " " + df[s1_dep_time].astype(str), errors="coerce")
-        df["Best_End"]      = df["Stop2_Arrival"].fillna(df["Stop2_Depart"]).fillna(df["Stop1_Depart"])
-
-        # Only count trips with status "Completed" — Cancelled and Not Started are excluded
-        if "Load Execution Status" in df.columns:
-            df = df[df["Load Execution Status"].astype(str).str.strip() == "Completed"]
-
-        # Only drop rows where we have no start OR no end — not just missing Stop2_Actual
-        df = df.dropna(subset=["Stop1_Actual", "Best_End"])
-
-        for _, gp in df.groupby("Trip ID"):
-            gp = gp.sort_values("Stop1_Actual")
-            start_act = gp.iloc[0]["Stop1_Actual"]
-            end_act   = gp.iloc[-1]["Best_End"]
-
-            # Handle overnight trips (midnight crossing)
-            if end_act < start_act:
-                end_act += pd.Timedelta(days=1)
-
-            raw_hours = (end_act - start_act).total_seconds() / 3600
-
-            # If trip duration is suspiciously long (>20h), use planned start
-            # for the HOUR CALCULATION only — date is always from end_act
-            start_for_hours = (
-                gp.iloc[0]["Stop1_Planned"]
-                if raw_hours > 20 and pd.notna(gp.iloc[0]["Stop1_Planned"])
-                else start_act
-            )
+def _datetime_formats(values, sample=5):
+    """
+    strftime formats guessed month-first and day-first from the first
+    `sample` values pandas can recognise, month-first guesses first.
+    """
+    candidates = []
+    with warnings.catch_warnings():
+        # guess_datetime_format warns when a value only fits the other order
+        warnings.simplefilter("ignore", UserWarning)
+        for value in values:
+            guesses = [guess_datetime_format(value, dayfirst=dayfirst) for dayfirst in (False, True)]
+            if not any(guesses):
+                continue
+            for fmt in guesses:
+                if fmt and fmt not in candidates:
+                    candidates.append(fmt)
+            sample -= 1
+            if sample == 0:
+                break
+    return candidates
+
+def _parse_date_time(dates, times):
+    """
+    Combines a date and a time column into datetimes.
+    Only the unique "date time" strings are parsed; results are mapped back
+    through the factorized codes. The layout is detected for each column on
+    its own, so files exported differently (d/m vs m/d) never share a format
+    and the result doesn't depend on file order. Of the guessed formats the
+    one parsing the most values wins, so an ambiguous first value
+    (03/02/2024) can't lock in the wrong order; ties stay month-first.
+    """
+    combined = dates.astype(str) + " " + times.astype(str)
+    codes, uniques = pd.factorize(combined)
+    uniques = pd.Index(uniques).astype(str)
+
+    candidates = _datetime_formats(uniques) or [None]
+    parsed = pd.to_datetime(uniques, format=candidates[0], errors="coerce")
+    for fmt in candidates[1:]:
+        # Only a format that reads some of the leftovers can do better
+        leftovers = uniques[parsed.isna()]
+        if not pd.to_datetime(leftovers, format=fmt, errors="coerce").notna().any():
+            continue
+        attempt = pd.to_datetime(uniques, format=fmt, errors="coerce")
+        if attempt.notna().sum() > parsed.notna().sum():
+            parsed = attempt
+
+    # Missing cells factorize to -1 and come back as NaT
+    values = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(values, index=combined.index)
+
+def _reduce_trips(df):
+    """Collapses stop rows into one Driver/Date/Hours row per Trip ID."""
+    if df.empty:
+        return pd.DataFrame(columns=["Driver", "Date", "Hours"])
+
+    # Order stops by start time within each trip. A stable sort keeps the
+    # original row order for stops sharing a start time.
+    df = df.sort_values(["Trip ID", "Stop1_Actual"], kind="mergesort")
+    df = df.dropna(subset=["Trip ID"])
 
-            # Date assigned = day the trip ENDS (not starts).
-            # Overnight trips starting Feb 13 and ending Feb 14 count under Feb 14.
-            assigned_date = end_act.date()
-            trip_hours    = round((end_act - start_for_hours).total_seconds() / 3600, 2)
-
-            # Most frequent driver name wins ALL hours for the whole trip/block.
-            # Clean semicolon-duplicated names (e.g. "JOHN DOE;JOHN DOE" → "JOHN DOE")
-            # so they don't split the vote against the true dominant driver.
-            dominant_driver = (
-                gp["Driver Name"]
-                .astype(str)
-                .str.split(";").str[0]   # take the part before any semicolon
-                .str.upper()
-                .str.strip()
-                .value_counts()
-                .idxmax()
+    first = df.drop_duplicates("Trip ID", keep="first").set_index("Trip ID")
+    last  = df.drop_duplicates("Trip ID", keep="last").set_index("Trip ID")
+
+    start_act = first["Stop1_Actual"]
+    end_act   = last["Best_End"]
+
+    # Handle overnight trips (midnight crossing)
+    end_act = end_act.mask(end_act < start_act, end_act + pd.Timedelta(days=1))
+
+    raw_hours = (end_act - start_act).dt.total_seconds() / 3600
+
+    # If trip duration is suspiciously long (>20h), use planned start
+    # for the HOUR CALCULATION only — date is always from end_act
+    use_planned = (raw_hours > 20) & first["Stop1_Planned"].notna()
+    start_for_hours = start_act.mask(use_planned, first["Stop1_Planned"])
+
+    # Date assigned = day the trip ENDS (not starts).
+    # Overnight trips starting Feb 13 and ending Feb 14 count under Feb 14.
+    assigned_date = end_act.dt.date
+    trip_hours    = ((end_act - start_for_hours).dt.total_seconds() / 3600).round(2)
+
+    # Most frequent driver name wins ALL hours for the whole trip/block.
+    # Clean semicolon-duplicated names (e.g. "JOHN DOE;JOHN DOE" → "JOHN DOE")
+    # so they don't split the vote against the true dominant driver.
+    # Ties go to the name seen first in start-time order.
+    votes = pd.DataFrame({
+        "Trip ID": df["Trip ID"].to_numpy(),
+        "Driver":  df["Driver Name"].astype(str).str.split(";").str[0].str.upper().str.strip().to_numpy(),
+        "Pos":     np.arange(len(df)),
+    })
+    votes = (
+        votes.groupby(["Trip ID", "Driver"], sort=False)["Pos"]
+        .agg(["size", "min"])
+        .reset_index()
+        .sort_values(["size", "min"], ascending=[False, True], kind="mergesort")
+        .drop_duplicates("Trip ID")
+        .set_index("Trip ID")
+    )
+    dominant_driver = votes["Driver"].reindex(start_act.index)
+
+    return pd.DataFrame({
+        "Driver": dominant_driver.to_numpy(),
+        "Date":   assigned_date.to_numpy(),
+        "Hours":  trip_hours.to_numpy(),
+    })
+
+def _process_relay_file(raw):
+    """Reduces one Relay CSV to its trip table."""
+    df = pd.read_csv(io.BytesIO(raw))
+
+    # Standardize headers (strip extra spaces)
+    df.columns = [c.strip() for c in df.columns]
+
+    s1_act_date = "Stop 1  Actual Arrival Date"
+    s1_act_time = "Stop 1  Actual Arrival Time"
+    s2_arr_date = "Stop 2  Actual Arrival Date"
+    s2_arr_time = "Stop 2  Actual Arrival Time"
+    s2_dep_date = "Stop 2 Actual Departure Date"
+    s2_dep_time = "Stop 2 Actual Departure Time"
+    s1_dep_date = "Stop 1 Actual Departure Date"
+    s1_dep_time = "Stop 1 Actual Departure Time"
+    p1_date     = "Stop 1 Planned Arrival Date"
+    p1_time     = "Stop 1 Planned Arrival Time"
+
+    df["Stop1_Actual"]  = _parse_date_time(df[s1_act_date], df[s1_act_time])
+    df["Stop1_Planned"] = _parse_date_time(df[p1_date],     df[p1_time])
+
+    # Best end time per row — cascading fallback:
+    # 1st choice: Stop 2 Actual Arrival (most accurate)
+    # 2nd choice: Stop 2 Actual Departure (if arrival missing)
+    # 3rd choice: Stop 1 Actual Departure (last resort)
+    df["Stop2_Arrival"] = _parse_date_time(df[s2_arr_date], df[s2_arr_time])
+    df["Stop2_Depart"]  = _parse_date_time(df[s2_dep_date], df[s2_dep_time])
+    df["Stop1_Depart"]  = _parse_date_time(df[s1_dep_date], df[s1_dep_time])
+    df["Best_End"]      = df["Stop2_Arrival"].fillna(df["Stop2_Depart"]).fillna(df["Stop1_Depart"])
+
+    # Only count trips with status "Completed" — Cancelled and Not Started are excluded
+    if "Load Execution Status" in df.columns:
+        df = df[df["Load Execution Status"].astype(str).str.strip() == "Completed"]
+
+    # Only drop rows where we have no start OR no end — not just missing Stop2_Actual
+    df = df.dropna(subset=["Stop1_Actual", "Best_End"])
+
+    return _reduce_trips(df)
+
+_relay_pool = None
+_relay_pool_workers = None
+_relay_pool_lock = threading.Lock()
+
+def _get_relay_pool(max_workers):
+    """
+    The process pool for Relay files, started on first use and reused by
+    every later run, so workers import pandas once per server rather than
+    once per run. Workers are started with "spawn" so they never inherit
+    the server's threads and locks via fork.
+    """
+    global _relay_pool, _relay_pool_workers
+    with _relay_pool_lock:
+        if _relay_pool is None or _relay_pool_workers != max_workers:
+            if _relay_pool is not None:
+                _relay_pool.shutdown(wait=False)
+            _relay_pool = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
             )
+            _relay_pool_workers = max_workers
+        return _relay_pool
+
+def _discard_relay_pool(pool):
+    """Drops a broken pool so the next run starts a fresh one."""
+    global _relay_pool
+    with _relay_pool_lock:
+        if _relay_pool is pool:
+            _relay_pool = None
+    pool.shutdown(wait=False)
+
+def process_relay(contents, max_workers=1, cache=None):
+    """
+    Processes Relay CSV files and calculates trip duration.
+    Files are independent, so with max_workers other than 1 they are fanned
+    out over a process pool (None = one worker per CPU) and the per-file
+    trip tables are concatenated in upload order. With a cache, files whose
+    bytes were already reduced are served from disk and skip the pool.
+    """
+    keys = [cache.key("relay", raw) for raw in contents] if cache is not None else []
+    trip_frames = [cache.get(key) for key in keys] if keys else [None] * len(contents)
+    missing = [i for i, trips in enumerate(trip_frames) if trips is None]
 
-            all_rows.append([dominant_driver, assigned_date, trip_hours])
+    if max_workers != 1 and len(missing) > 1:
+        pool = _get_relay_pool(max_workers)
+        try:
+            results = pool.map(_process_relay_file, [contents[i] for i in missing])
+            for i, trips in zip(missing, results):
+                trip_frames[i] = trips
+        except BrokenProcessPool:
+            # A worker died; files it didn't finish are parsed in-process below
+            _discard_relay_pool(pool)
+    for i in missing:
+        if trip_frames[i] is None:
+            trip_frames[i] = _process_relay_file(contents[i])
 
-    if not all_rows:
+    if keys:
+        for i in missing:
+            cache.put(keys[i], trip_frames[i])
+
+    trip_frames = [f for f in trip_frames if not f.empty]
+    if not trip_frames:
         return pd.DataFrame(columns=["Driver", "Date", "Hours"]), None
 
-    result_df = pd.DataFrame(all_rows, columns=["Driver", "Date", "Hours"])
+    result_df = pd.concat(trip_frames, ignore_index=True)
     return result_df, None
 
-def build_final_dataset(adp_df, relay_df, dp_df):
+def build_final_dataset(adp_df, relay_df, dp_df, workers=1, alias_store=None):
     """
     Merges datasets and handles the Relay Date Drop requirement.
     1. Establish Master List from ADP.
@@ -137,11 +354,11 @@ def build_final_dataset(adp_df, relay_df, dp_df):
     3. Sorts columns to ensure 1st 7 days = Week 1, next 7 days = Week 2.
     """
     adp_names = adp_df["Driver"].unique().tolist()
-    mapper = get_fuzzy_name_mapper(adp_names)
+    mapper = get_fuzzy_name_mapper(adp_names, workers=workers, alias_store=alias_store)
 
     # Apply Fuzzy Mapping
-    relay_df["Driver"] = relay_df["Driver"].apply(mapper)
-    dp_df["Driver"] = dp_df["Driver"].astype(str).str.upper().str.strip().apply(mapper)
+    relay_df["Driver"] = mapper(relay_df["Driver"])
+    dp_df["Driver"] = mapper(dp_df["Driver"].astype(str).str.upper().str.strip())
     
     # --- Pivot Relay Data ---
     relay_pivot = relay_df.pivot_table(index="Driver", columns="Date", values="Hours", aggfunc="sum").fillna(0)
@@ -178,19 +395,46 @@ def build_final_dataset(adp_df, relay_df, dp_df):
     
     return final_df[base_cols + relay_cols + adp_cols], relay_cols, adp_cols
 
-def build_override_dict(override_df, start_date, end_date, adp_df):
+class OverrideMap(dict):
+    """
+    (driver, date) -> override price, plus `totals`: an upper-cased
+    driver -> summed price index so per-driver lookups are O(1).
+    """
+
+    def __init__(self, detail=(), totals=None):
+        super().__init__(detail)
+        if totals is None:
+            totals = {}
+            for (driver, _), price in self.items():
+                key = str(driver).upper()
+                totals[key] = totals.get(key, 0) + price
+        self.totals = totals
+
+def override_totals(override_map):
+    """Per-driver override totals for an OverrideMap or a plain (driver, date) dict."""
+    if isinstance(override_map, OverrideMap):
+        return override_map.totals
+    return OverrideMap(override_map).totals
+
+def build_override_dict(override_df, start_date, end_date, adp_df, workers=1, alias_store=None):
     """Filters overrides and maps to ADP master drivers."""
     if override_df is None or override_df.empty: 
-        return {}
+        return OverrideMap()
     
     adp_names = adp_df["Driver"].unique().tolist()
-    mapper = get_fuzzy_name_mapper(adp_names)
+    mapper = get_fuzzy_name_mapper(adp_names, workers=workers, alias_store=alias_store)
     
-    override_df["Driver"] = override_df["Driver"].astype(str).apply(mapper)
+    override_df["Driver"] = mapper(override_df["Driver"].astype(str))
     override_df["Date"] = pd.to_datetime(override_df["Date"]).dt.date
     
     mask = (override_df["Date"] >= start_date) & (override_df["Date"] <= end_date)
-    filtered_df = override_df.loc[mask]
-    
-    return {(row["Driver"], row["Date"]): row["Override Price"] for _, row in filtered_df.iterrows()}
+    # A repeated (driver, date) entry replaces the earlier one
+    filtered_df = override_df.loc[mask].drop_duplicates(["Driver", "Date"], keep="last")
 
+    detail = zip(zip(filtered_df["Driver"], filtered_df["Date"]), filtered_df["Override Price"])
+    totals = (
+        filtered_df.groupby(filtered_df["Driver"].astype(str).str.upper())["Override Price"]
+        .sum()
+        .to_dict()
+    )
+    return OverrideMap(detail, totals)
@@ -1,11 +1,81 @@
 import io
-from urllib.parse import urlencode, urlparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import unquote, urlencode, urlparse
 
 import msal
 import requests
+import streamlit as st
 from openpyxl import load_workbook
+from requests.adapters import HTTPAdapter
 
-from payroll_app.config import REDIRECT_URI, SCOPES
+from payroll_app.cache import DownloadCache
+from payroll_app.config import (
+    DOWNLOAD_CACHE_DIR,
+    DOWNLOAD_CACHE_MAX_BYTES,
+    DOWNLOAD_WORKERS,
+    GRAPH_POOL_SIZE,
+    LISTING_DELTA,
+    LISTING_TTL,
+    REDIRECT_URI,
+    SCOPES,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_RETRIES,
+)
+from payroll_app.xlsx_merge import merge_sheets
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+
+# Item fields folder listings ask for, and children per listing page
+LIST_FIELDS = ("id", "name", "folder", "size", "eTag", "lastModifiedDateTime")
+LIST_PAGE_SIZE = 200
+
+# Largest file Graph takes in a single PUT .../content
+SIMPLE_UPLOAD_MAX = 4 * 1024 * 1024
+
+
+class GraphClient:
+    """
+    Graph API calls over one pooled requests.Session, so connections to
+    graph.microsoft.com stay open (keep-alive) and are reused across calls
+    instead of doing a TLS handshake for each request. Safe to share
+    between threads and users: the session keeps no cookies, and every
+    call carries its own token. At most pool_size requests per host are in
+    flight; further callers wait for a free connection.
+    """
+
+    def __init__(self, pool_size=GRAPH_POOL_SIZE):
+        self.session = requests.Session()
+        # One cookie jar would be shared by every user of the process
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        # Graph itself plus the SharePoint hosts serving downloads and uploads
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, access_token, headers=None, **kwargs):
+        """access_token=None sends no Authorization (pre-authenticated URLs)."""
+        headers = dict(headers or {})
+        if access_token is not None:
+            headers["Authorization"] = f"Bearer {access_token}"
+        return self.session.request(method, url, headers=headers, **kwargs)
+
+    def get(self, url, access_token, **kwargs):
+        return self.request("GET", url, access_token, **kwargs)
+
+    def put(self, url, access_token, **kwargs):
+        return self.request("PUT", url, access_token, **kwargs)
+
+
+@st.cache_resource
+def get_graph_client():
+    """The GraphClient shared by every session of this process."""
+    return GraphClient()
+
+
+@st.cache_resource
+def get_download_cache():
+    return DownloadCache(DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES)
 
 
 def get_auth_url(client_id, tenant_id):
@@ -38,11 +108,7 @@ def exchange_code_for_token(auth_code, client_id, tenant_id, client_secret):
 
 
 def get_user_info(access_token):
-    resp = requests.get(
-        "https://graph.microsoft.com/v1.0/me",
-        headers={"Authorization": f"Bearer {access_token}"},
-        timeout=30,
-    )
+    resp = get_graph_client().get(f"{GRAPH_URL}/me", access_token, timeout=30)
     if resp.status_code == 200:
         return resp.json()
     return None
@@ -52,13 +118,12 @@ def get_site_from_url(access_token, sharepoint_url):
     try:
         parsed = urlparse(sharepoint_url)
         path_parts = parsed.path.strip("/").split("/")
-        headers = {"Authorization": f"Bearer {access_token}"}
         if "sites" in path_parts:
             site_slug = path_parts[path_parts.index("sites") + 1]
-            url = f"https://graph.microsoft.com/v1.0/sites/{parsed.hostname}:/sites/{site_slug}"
+            url = f"{GRAPH_URL}/sites/{parsed.hostname}:/sites/{site_slug}"
         else:
-            url = f"https://graph.microsoft.com/v1.0/sites/{parsed.hostname}"
-        resp = requests.get(url, headers=headers, timeout=30)
+            url = f"{GRAPH_URL}/sites/{parsed.hostname}"
+        resp = get_graph_client().get(url, access_token, timeout=30)
         if resp.status_code == 200:
             return resp.json(), None
         return None, f"Error: {resp.status_code}"
@@ -66,50 +131,218 @@ def get_site_from_url(access_token, sharepoint_url):
         return None, str(exc)
 
 
+def iter_sharepoint_files(access_token, site_id, path="root", page_size=LIST_PAGE_SIZE):
+    """
+    Lists a folder one page at a time: yields (items, None) per page of up
+    to page_size children, following @odata.nextLink, with only LIST_FIELDS
+    on each item. A failed request yields (None, err) and ends the listing.
+    """
+    if path == "root":
+        url = f"{GRAPH_URL}/sites/{site_id}/drive/root/children"
+    else:
+        url = f"{GRAPH_URL}/sites/{site_id}/drive/root:/{path}:/children"
+    params = {"$select": ",".join(LIST_FIELDS), "$top": page_size}
+    while url:
+        try:
+            resp = get_graph_client().get(url, access_token, params=params, timeout=30)
+            if resp.status_code != 200:
+                yield None, "Folder error"
+                return
+            page = resp.json()
+        except Exception as exc:
+            yield None, str(exc)
+            return
+        yield page.get("value", []), None
+        # nextLink already carries the query
+        url, params = page.get("@odata.nextLink"), None
+
+
 def list_sharepoint_files(access_token, site_id, path="root"):
+    """Every child of a folder, all pages read."""
+    items = []
+    for page, err in iter_sharepoint_files(access_token, site_id, path):
+        if err:
+            return None, err
+        items.extend(page)
+    return items, None
+
+
+def _delta_folder(item):
+    """Folder path (as the pickers name it) holding a delta feed item, or None."""
+    parent = (item.get("parentReference") or {}).get("path")
+    if not parent or "root:" not in parent:
+        return None
+    return unquote(parent.split("root:", 1)[1]).strip("/") or "root"
+
+
+class ListingCache:
+    """
+    Folder listings per (site_id, path), reused for ttl seconds. With
+    use_delta, an expired listing is brought up to date from the drive's
+    delta feed (only the items changed since the last check, for every
+    cached folder of the site at once) instead of being listed again.
+    Keep one per user session: listings depend on the user's permissions.
+    """
+
+    def __init__(self, ttl=LISTING_TTL, use_delta=LISTING_DELTA):
+        self.ttl = ttl
+        self.use_delta = use_delta
+        self.entries = {}  # (site_id, path) -> {"items": [...], "fetched": monotonic time}
+        self.delta_links = {}  # site_id -> deltaLink to read changes from
+
+    def get(self, access_token, site_id, path):
+        """The cached items of a folder, or None when it has to be listed."""
+        key = (site_id, path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["fetched"] > self.ttl:
+            if not (self.use_delta and self._apply_delta(access_token, site_id)):
+                del self.entries[key]
+                return None
+        return entry["items"]
+
+    def pages(self, access_token, site_id, path):
+        """Like iter_sharepoint_files; the listing is cached once complete."""
+        if self.use_delta and site_id not in self.delta_links:
+            # Taken before listing, so changes made meanwhile still show up
+            self.delta_links[site_id] = _latest_delta_link(access_token, site_id)
+        started = time.monotonic()
+        items = []
+        for page, err in iter_sharepoint_files(access_token, site_id, path):
+            if err:
+                yield None, err
+                return
+            items.extend(page)
+            yield page, None
+        self.entries[(site_id, path)] = {"items": items, "fetched": started}
+
+    def invalidate(self, site_id, path):
+        self.entries.pop((site_id, path), None)
+
+    def _apply_delta(self, access_token, site_id):
+        link = self.delta_links.get(site_id)
+        changes = []
+        try:
+            while link:
+                resp = get_graph_client().get(link, access_token, timeout=30)
+                if resp.status_code != 200:
+                    # e.g. 410 Gone: the token expired and listings must be read again
+                    self.delta_links.pop(site_id, None)
+                    return False
+                page = resp.json()
+                changes.extend(page.get("value", []))
+                link = page.get("@odata.nextLink")
+                if link is None:
+                    self.delta_links[site_id] = page.get("@odata.deltaLink")
+        except Exception:
+            return False
+        if not self.delta_links.get(site_id):
+            return False
+
+        now = time.monotonic()
+        cached = {path: entry for (site, path), entry in self.entries.items() if site == site_id}
+        for item in changes:
+            folder = None if "deleted" in item else _delta_folder(item)
+            # Moved, renamed, changed or deleted: drop the old entry, re-add where it lives now
+            for path, entry in cached.items():
+                items = [i for i in entry["items"] if i["id"] != item["id"]]
+                if path == folder:
+                    items.append({field: item[field] for field in LIST_FIELDS if field in item})
+                entry["items"] = items
+        for entry in cached.values():
+            entry["fetched"] = now
+        return True
+
+
+def _latest_delta_link(access_token, site_id):
+    """A delta link marking the drive's current state, without enumerating it."""
     try:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        if path == "root":
-            url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root/children"
-        else:
-            url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:/{path}:/children"
-        resp = requests.get(url, headers=headers, timeout=30)
+        resp = get_graph_client().get(
+            f"{GRAPH_URL}/sites/{site_id}/drive/root/delta",
+            access_token,
+            params={"token": "latest", "$select": ",".join(LIST_FIELDS + ("parentReference", "deleted"))},
+            timeout=30,
+        )
         if resp.status_code == 200:
-            return resp.json().get("value", []), None
-        return None, "Folder error"
-    except Exception as exc:
-        return None, str(exc)
+            return resp.json().get("@odata.deltaLink")
+    except Exception:
+        pass
+    return None
 
 
 def download_sharepoint_file(access_token, site_id, file_id):
+    """
+    Downloads a file, through the on-disk cache: when a copy is cached the
+    request carries its tag in If-None-Match, and an unchanged file (304)
+    is read from disk instead of downloaded again. Graph still checks the
+    user's access on every call.
+    """
+    cache = get_download_cache()
+    url = f"{GRAPH_URL}/sites/{site_id}/drive/items/{file_id}/content"
     try:
-        resp = requests.get(
-            f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/items/{file_id}/content",
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=90,
-        )
+        cached_tag = cache.tag(site_id, file_id)
+        headers = {"If-None-Match": cached_tag} if cached_tag else None
+        resp = get_graph_client().get(url, access_token, headers=headers, timeout=90)
+        if resp.status_code == 304:
+            content = cache.get(site_id, file_id, cached_tag)
+            if content is not None:
+                return content, None
+            resp = get_graph_client().get(url, access_token, timeout=90)  # evicted meanwhile
         if resp.status_code == 200:
+            tag = resp.headers.get("ETag")
+            if tag:
+                cache.put(site_id, file_id, tag, resp.content)
             return resp.content, None
         return None, "Download error"
     except Exception as exc:
         return None, str(exc)
 
 
+def download_sharepoint_files(access_token, site_id, file_ids, workers=DOWNLOAD_WORKERS, on_done=None):
+    """
+    Downloads several files at once on a bounded thread pool, so the total
+    wait is about that of the slowest file. Returns [(content, err)] in the
+    order of file_ids; a failed file doesn't stop the others. on_done(index,
+    content, err) is called from the calling thread as each one finishes.
+    """
+    results = [(None, None)] * len(file_ids)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(file_ids) or 1))) as pool:
+        futures = {
+            pool.submit(download_sharepoint_file, access_token, site_id, file_id): index
+            for index, file_id in enumerate(file_ids)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if on_done is not None:
+                on_done(index, *results[index])
+    return results
+
+
+def _item_url(site_id, folder_path, filename):
+    if folder_path != "root":
+        return f"{GRAPH_URL}/sites/{site_id}/drive/root:/{folder_path}/{filename}:"
+    return f"{GRAPH_URL}/sites/{site_id}/drive/root:/{filename}:"
+
+
 def upload_to_sharepoint(access_token, site_id, folder_path, filename, file_content):
+    """
+    Uploads bytes or any seekable binary file object (a BytesIO, an open
+    file, a SpooledTemporaryFile), replacing any file of that name. Streams
+    are only seeked and read, never copied whole with getvalue(); files
+    larger than SIMPLE_UPLOAD_MAX go through a resumable upload session
+    that reads one chunk at a time.
+    """
     try:
-        if folder_path != "root":
-            url = (
-                f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:"
-                f"/{folder_path}/{filename}:/content"
-            )
-        else:
-            url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:/{filename}:/content"
-        resp = requests.put(
-            url,
-            headers={"Authorization": f"Bearer {access_token}"},
-            data=file_content,
-            timeout=90,
-        )
+        if isinstance(file_content, (bytes, bytearray)):
+            file_content = io.BytesIO(file_content)
+        size = file_content.seek(0, io.SEEK_END)
+        file_content.seek(0)
+        item_url = _item_url(site_id, folder_path, filename)
+        if size > SIMPLE_UPLOAD_MAX:
+            return _upload_in_chunks(access_token, item_url, file_content, size)
+        resp = get_graph_client().put(f"{item_url}/content", access_token, data=file_content.read(), timeout=90)
         if resp.status_code in [200, 201]:
             return True, None
         return False, f"Error: {resp.status_code}"
@@ -117,13 +350,72 @@ def upload_to_sharepoint(access_token, site_id, folder_path, filename, file_cont
         return False, str(exc)
 
 
+def _upload_in_chunks(access_token, item_url, stream, size):
+    """
+    createUploadSession upload: the stream is read and sent UPLOAD_CHUNK_SIZE
+    bytes at a time. A failed chunk is retried with backoff from the offset
+    the session reports as missing, up to UPLOAD_RETRIES times in a row.
+    """
+    client = get_graph_client()
+    resp = client.request(
+        "POST", f"{item_url}/createUploadSession", access_token,
+        json={"item": {"@microsoft.graph.conflictBehavior": "replace"}},
+        timeout=30,
+    )
+    if resp.status_code != 200:
+        return False, f"Error: {resp.status_code}"
+    upload_url = resp.json()["uploadUrl"]
+
+    offset, failures = 0, 0
+    while offset < size:
+        stream.seek(offset)
+        chunk = stream.read(min(UPLOAD_CHUNK_SIZE, size - offset))
+        headers = {"Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{size}"}
+        try:
+            # The upload URL is pre-authenticated and must not get the bearer token
+            resp = client.put(upload_url, None, data=chunk, headers=headers, timeout=90)
+        except requests.RequestException:
+            resp = None
+        if resp is not None and resp.status_code in (200, 201):
+            return True, None
+        if resp is not None and resp.status_code == 202:
+            offset, failures = _next_expected(resp.json(), offset + len(chunk)), 0
+            continue
+        if resp is not None and resp.status_code == 404:
+            return False, "Upload session expired"
+        failures += 1
+        if failures > UPLOAD_RETRIES:
+            client.request("DELETE", upload_url, None, timeout=30)
+            status = resp.status_code if resp is not None else "connection lost"
+            return False, f"Upload failed at byte {offset}: {status}"
+        time.sleep(2 ** (failures - 1))
+        offset = _resume_offset(client, upload_url, offset)
+    return False, "Upload session did not complete"
+
+
+def _next_expected(session, default):
+    """Start of the first byte range an upload session still expects."""
+    ranges = session.get("nextExpectedRanges") or []
+    return int(ranges[0].split("-")[0]) if ranges else default
+
+
+def _resume_offset(client, upload_url, offset):
+    try:
+        resp = client.get(upload_url, None, timeout=30)
+        if resp.status_code == 200:
+            return _next_expected(resp.json(), offset)
+    except requests.RequestException:
+        pass
+    return offset
+
+
 def check_workbook_exists(access_token, site_id, folder_path, workbook_name="ADP.xlsx"):
     try:
         if folder_path != "root":
-            url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:/{folder_path}/{workbook_name}"
+            url = f"{GRAPH_URL}/sites/{site_id}/drive/root:/{folder_path}/{workbook_name}"
         else:
-            url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:/{workbook_name}"
-        resp = requests.get(url, headers={"Authorization": f"Bearer {access_token}"}, timeout=30)
+            url = f"{GRAPH_URL}/sites/{site_id}/drive/root:/{workbook_name}"
+        resp = get_graph_client().get(url, access_token, timeout=30)
         if resp.status_code == 200:
             return True, resp.json().get("id")
         return False, None
@@ -131,7 +423,26 @@ def check_workbook_exists(access_token, site_id, folder_path, workbook_name="ADP
         return False, None
 
 
-def add_sheet_to_workbook(existing_wb_bytes, new_sheet_bytes, sheet_name):
+def add_sheet_to_workbook(existing_wb_bytes, new_sheet_bytes, sheet_name,
+                          shared_strings=False, compress_level=None):
+    """
+    Adds the generated sheet (and its helper sheets) to an existing workbook.
+    The zip-level merge leaves existing sheets untouched; packages it can't
+    handle fall back to copying the cells through openpyxl, which ignores
+    shared_strings and compress_level.
+    """
+    try:
+        merged = merge_sheets(
+            existing_wb_bytes, new_sheet_bytes, sheet_name,
+            shared_strings=shared_strings, compress_level=compress_level,
+        )
+        return io.BytesIO(merged), None
+    except Exception as exc:
+        print(f"Package merge not possible ({exc}); copying cells instead")
+    return _copy_sheet_cells(existing_wb_bytes, new_sheet_bytes, sheet_name)
+
+
+def _copy_sheet_cells(existing_wb_bytes, new_sheet_bytes, sheet_name):
     try:
         wb = load_workbook(io.BytesIO(existing_wb_bytes))
         if sheet_name in wb.sheetnames:
@@ -149,6 +460,28 @@ def add_sheet_to_workbook(existing_wb_bytes, new_sheet_bytes, sheet_name):
                     new_cell.fill = cell.fill.copy()
                     new_cell.number_format = cell.number_format
                     new_cell.alignment = cell.alignment.copy()
+        for cf in new_ws.conditional_formatting:
+            for rule in cf.rules:
+                ws.conditional_formatting.add(str(cf.sqref), rule)
+
+        # Helper sheets (the hidden Rates table) and the names formulas use.
+        # Existing ones are never replaced: other sheets may refer to them.
+        taken = {name.lower() for name in wb.sheetnames}
+        for extra_name in new_wb.sheetnames[1:]:
+            if extra_name.lower() in taken:
+                return None, f"Workbook already has a sheet named {extra_name}"
+        defined = {name.lower() for name in wb.defined_names}
+        for name in new_wb.defined_names:
+            if name.lower() in defined:
+                return None, f"Workbook already defines the name {name}"
+        for extra_name in new_wb.sheetnames[1:]:
+            src = new_wb[extra_name]
+            dst = wb.create_sheet(extra_name)
+            dst.sheet_state = src.sheet_state
+            for values in src.iter_rows(values_only=True):
+                dst.append(values)
+        for name, defined in new_wb.defined_names.items():
+            wb.defined_names[name] = defined
 
         output = io.BytesIO()
         wb.save(output)
@@ -404,8 +404,30 @@ import streamlit as st
 from openpyxl import load_workbook
  
 # Internal Imports
-from payroll_app.config import load_azure_credentials
-from payroll_app.excel_builder import create_excel
+from payroll_app.aliases import AliasStore
+from payroll_app.cache import FrameCache
+from payroll_app.config import (
+    ALIAS_DB_PATH,
+    EXCEL_BACKEND,
+    EXCEL_CELL_VALUES,
+    EXCEL_COMPACT_FORMULAS,
+    EXCEL_COMPRESS_LEVEL,
+    EXCEL_CONDITIONAL_FORMATTING,
+    EXCEL_PRUNE_STYLES,
+    EXCEL_SHARED_STRINGS,
+    EXCEL_STREAMING,
+    FRAME_CACHE_DIR,
+    FRAME_CACHE_MAX_BYTES,
+    FUZZY_WORKERS,
+    RELAY_WORKERS,
+    SKIP_EXCEL,
+    TABLE_EXPORTS,
+    load_azure_credentials,
+)
+from payroll_app.excel_builder import CELL_VALUE_MODES, EXCEL_BACKENDS, create_excel
+from payroll_app.exports import TABLE_FORMATS, export_table, payroll_table
+from payroll_app.pay_engine import compute_pay
+from payroll_app.pipeline import StageCache, fingerprint
 from payroll_app.processing import (
     build_final_dataset,
     build_override_dict,
@@ -417,11 +439,12 @@ from payroll_app.sharepoint import (
     add_sheet_to_workbook,
     check_workbook_exists,
     download_sharepoint_file,
+    download_sharepoint_files,
     exchange_code_for_token,
     get_auth_url,
     get_site_from_url,
     get_user_info,
-    list_sharepoint_files,
+    ListingCache,
     upload_to_sharepoint,
 )
 from payroll_app.state import init_session_state
@@ -553,6 +576,82 @@ def _file_icon(name):
     if name.endswith(".pdf"):  return "📕"
     return "📎"
  
+def _listing_cache():
+    if "listing_cache" not in st.session_state:
+        st.session_state.listing_cache = ListingCache()
+    return st.session_state.listing_cache
+ 
+def _folder_items(key_pref, path):
+    """
+    (items, err) of the SharePoint folder a picker shows. Cached listings
+    come back at once; otherwise the first page is fetched right away and
+    _load_more_items adds the others after the page has rendered.
+    """
+    listing_key = f"{key_pref}_listing"
+    listing = st.session_state.get(listing_key)
+    site_id = st.session_state.site_info["id"]
+    token = st.session_state.access_token
+    # Keep streaming a listing in progress; otherwise go through the cache
+    if listing is None or listing["where"] != (site_id, path) or listing["pages"] is None:
+        cached = _listing_cache().get(token, site_id, path)
+        listing = {
+            "where": (site_id, path),
+            "pages": None if cached is not None else _listing_cache().pages(token, site_id, path),
+            "items": list(cached) if cached is not None else [],
+            "error": None,
+        }
+        st.session_state[listing_key] = listing
+        if cached is None:
+            _fetch_page(listing)
+    if listing["pages"] is not None:
+        st.session_state.setdefault("pending_listings", []).append(listing_key)
+        st.caption(f"Loading more… {len(listing['items'])} items so far")
+    return listing["items"], listing["error"]
+ 
+def _fetch_page(listing):
+    page, err = next(listing["pages"], (None, None))
+    if page is None:
+        listing["pages"], listing["error"] = None, err  # complete, or failed
+    else:
+        listing["items"].extend(page)
+ 
+def _load_more_items():
+    """Reads one more page of every listing shown in this run, then reruns."""
+    pending = st.session_state.pop("pending_listings", [])
+    for listing_key in pending:
+        _fetch_page(st.session_state[listing_key])
+    if pending:
+        st.rerun()
+ 
+def _forget_listing(path):
+    """Drops the cached listing of a folder we just uploaded to."""
+    _listing_cache().invalidate(st.session_state.site_info["id"], path)
+ 
+def _download_files(file_objs):
+    """
+    Downloads the picked SharePoint files in parallel with per-file progress.
+    Returns (contents in pick order, names of the files that failed).
+    """
+    total = len(file_objs)
+    progress = st.progress(0.0, text=f"Downloading {total} file{'s' if total != 1 else ''}...")
+    finished = []
+ 
+    def on_done(index, content, err):
+        finished.append(index)
+        mark = "✓" if content else "✗"
+        progress.progress(len(finished) / total, text=f"{mark} {file_objs[index]['name']} ({len(finished)}/{total})")
+ 
+    results = download_sharepoint_files(
+        st.session_state.access_token,
+        st.session_state.site_info["id"],
+        [f["id"] for f in file_objs],
+        on_done=on_done,
+    )
+    failed = [f["name"] for f, (content, _) in zip(file_objs, results) if not content]
+    if failed:
+        st.warning(f"Could not download: {', '.join(failed)}")
+    return [content for content, _ in results if content], failed
+ 
 def _render_sharepoint_file_picker(
     title,
     file_types,
@@ -630,11 +729,7 @@ def _render_sharepoint_file_picker(
                 st.rerun()
  
         # ── Fetch folder contents ──
-        items, err = list_sharepoint_files(
-            st.session_state.access_token,
-            st.session_state.site_info["id"],
-            st.session_state[path_key],
-        )
+        items, err = _folder_items(key_pref, st.session_state[path_key])
         if err or not items:
             st.info("📂 Folder is empty")
             return
@@ -695,34 +790,28 @@ def _render_sharepoint_file_picker(
             type="primary",
             use_container_width=True,
         ):
-            with st.spinner(f"Downloading..."):
-                if select_mode == "multiple":
-                    downloaded = []
-                    for filename in selected:
-                        file_obj = next(f for f in files if f["name"] == filename)
-                        content, _ = download_sharepoint_file(
-                            st.session_state.access_token,
-                            st.session_state.site_info["id"],
-                            file_obj["id"],
-                        )
-                        if content:
-                            downloaded.append(content)
-                    # Only persist if download succeeded — never wipe existing data
-                    if downloaded:
-                        st.session_state[state_key_data] = downloaded
-                        st.rerun()
-                else:
-                    file_obj = next(f for f in files if f["name"] == selected[0])
-                    content, _ = download_sharepoint_file(
-                        st.session_state.access_token,
-                        st.session_state.site_info["id"],
-                        file_obj["id"],
-                    )
-                    if content:
-                        st.session_state[state_key_data] = content
-                        if state_key_name:
-                            st.session_state[state_key_name] = file_obj["name"]
+            if select_mode == "multiple":
+                downloaded, failed = _download_files(
+                    [next(f for f in files if f["name"] == filename) for filename in selected]
+                )
+                # Only persist if download succeeded — never wipe existing data
+                if downloaded:
+                    st.session_state[state_key_data] = downloaded
+                    if not failed:  # otherwise keep the warning on screen
                         st.rerun()
+                return
+            with st.spinner(f"Downloading..."):
+                file_obj = next(f for f in files if f["name"] == selected[0])
+                content, _ = download_sharepoint_file(
+                    st.session_state.access_token,
+                    st.session_state.site_info["id"],
+                    file_obj["id"],
+                )
+                if content:
+                    st.session_state[state_key_data] = content
+                    if state_key_name:
+                        st.session_state[state_key_name] = file_obj["name"]
+                    st.rerun()
  
 def _render_adp_picker():
     if "adp_path" not in st.session_state:
@@ -765,11 +854,7 @@ def _render_adp_picker():
                 )
                 st.rerun()
  
-        items, _ = list_sharepoint_files(
-            st.session_state.access_token,
-            st.session_state.site_info["id"],
-            st.session_state.adp_path,
-        )
+        items, _ = _folder_items("adp", st.session_state.adp_path)
         if not items:
             st.info("📂 Folder is empty")
             return
@@ -799,25 +884,78 @@ def _render_adp_picker():
         selected = st.multiselect("Select ADP CSV files:", [f["name"] for f in csv_files], key="adp_selected_files")
  
         if selected and st.button("⬇ Confirm ADP Files", key="adp_confirm_files", type="primary", use_container_width=True):
-            with st.spinner("Downloading ADP files..."):
-                downloaded = []
-                for filename in selected:
-                    file_obj = next(f for f in csv_files if f["name"] == filename)
-                    content, _ = download_sharepoint_file(
-                        st.session_state.access_token,
-                        st.session_state.site_info["id"],
-                        file_obj["id"],
-                    )
-                    if content:
-                        downloaded.append(content)
-                if downloaded:
-                    st.session_state.adp_files_data = downloaded
+            downloaded, failed = _download_files(
+                [next(f for f in csv_files if f["name"] == filename) for filename in selected]
+            )
+            if downloaded:
+                st.session_state.adp_files_data = downloaded
+                if not failed:
                     st.rerun()
  
+@st.cache_resource
+def _get_alias_store():
+    return AliasStore(ALIAS_DB_PATH)
+ 
+@st.cache_resource
+def _get_frame_cache():
+    return FrameCache(FRAME_CACHE_DIR, FRAME_CACHE_MAX_BYTES)
+ 
+def _render_alias_manager():
+    """Manual raw name -> ADP name pins that override fuzzy matching."""
+    store = _get_alias_store()
+    with st.expander("Driver Aliases", expanded=False):
+        st.caption("Pinned aliases always win over fuzzy matching, in every pay period.")
+        a_col1, a_col2, a_col3 = st.columns([3, 3, 1])
+        raw_name = a_col1.text_input("Name in Relay / DriverPay / Override", key="alias_raw")
+        adp_name = a_col2.text_input("ADP Payroll Name", key="alias_adp")
+        a_col3.markdown("<br>", unsafe_allow_html=True)
+        if a_col3.button("📌 Pin", key="alias_pin") and raw_name.strip() and adp_name.strip():
+            store.pin(raw_name, adp_name)
+            st.rerun()
+ 
+        pinned = store.pinned()
+        if not pinned:
+            st.markdown('<div class="fp-status-pending">No pinned aliases</div>', unsafe_allow_html=True)
+            return
+        for raw, adp in pinned:
+            p_col1, p_col2 = st.columns([6, 1])
+            p_col1.markdown(f"`{raw}` → **{adp}**")
+            if p_col2.button("✕", key=f"alias_unpin_{raw}", help="Unpin"):
+                store.unpin(raw)
+                st.rerun()
+ 
 def _render_output_config():
     st.markdown("---")
     st.subheader("Output Configuration")
     output_dest = st.radio("Save to:", ["Download Only", "SharePoint"], horizontal=True, key="out_dest_radio")
+    st.selectbox(
+        "Excel engine:",
+        EXCEL_BACKENDS,
+        index=EXCEL_BACKENDS.index(EXCEL_BACKEND),
+        key="excel_backend",
+        help="xlsxwriter is faster and lighter on memory for very large rosters",
+    )
+    st.selectbox(
+        "Cell contents:",
+        CELL_VALUE_MODES,
+        index=CELL_VALUE_MODES.index(EXCEL_CELL_VALUES),
+        key="excel_cell_values",
+        format_func={
+            "formulas": "Formulas",
+            "cached": "Formulas with cached results",
+            "values": "Values only (archive)",
+        }.get,
+        help="Cached results open without recalculation and can be read by "
+             "pandas or previews; they are written with xlsxwriter",
+    )
+    st.multiselect(
+        "Also export data as:",
+        list(TABLE_FORMATS),
+        default=[fmt for fmt in TABLE_EXPORTS if fmt in TABLE_FORMATS],
+        key="table_exports",
+        help="Driver rows with all pay columns, for analytics tools",
+    )
+    st.checkbox("Skip Excel workbook", value=SKIP_EXCEL, key="skip_excel")
     workbook_action = None
  
     if output_dest == "SharePoint" and st.session_state.get("site_info"):
@@ -832,11 +970,7 @@ def _render_output_config():
                 )
                 st.rerun()
  
-        items, _ = list_sharepoint_files(
-            st.session_state.access_token,
-            st.session_state.site_info["id"],
-            st.session_state.output_path,
-        )
+        items, _ = _folder_items("output", st.session_state.output_path)
         if items:
             folders = [i for i in items if "folder" in i]
             if folders:
@@ -862,12 +996,7 @@ def _render_output_config():
  
         # When adding to existing — let user pick the target .xlsx from the same folder
         if workbook_action == "Add Sheet to Existing Workbook":
-            items_now, _ = list_sharepoint_files(
-                st.session_state.access_token,
-                st.session_state.site_info["id"],
-                st.session_state.output_path,
-            )
-            xlsx_files = [i for i in (items_now or []) if i["name"].lower().endswith(".xlsx")]
+            xlsx_files = [i for i in items if i["name"].lower().endswith(".xlsx")]
             if xlsx_files:
                 chosen = st.selectbox(
                     "Select target workbook:",
@@ -885,6 +1014,32 @@ def _render_output_config():
  
     return output_dest, workbook_action
  
+def _size_label(stream):
+    """Size of a seekable stream, measured without copying its contents."""
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    return f"{size / 1024:,.0f} KB"
+ 
+def _deliver_tables(tables, output_dest, stem):
+    """Offers each tabular export for download or uploads it next to the workbook."""
+    for fmt, data in tables.items():
+        ext, mime = TABLE_FORMATS[fmt]
+        name = f"{stem}.{ext}"
+        if output_dest == "Download Only" or not st.session_state.get("access_token") \
+                or not st.session_state.get("site_info"):
+            st.download_button(f"📥 Download {fmt.upper()}", data, name, mime, key=f"dl_{fmt}")
+            continue
+        path = st.session_state.output_path
+        ok, err = upload_to_sharepoint(
+            st.session_state.access_token, st.session_state.site_info["id"], path, name, data,
+        )
+        if ok:
+            _forget_listing(path)
+            st.success(f"✅ Uploaded **{name}** to `{path}`")
+        else:
+            st.error(f"Upload of {name} failed: {err}")
+            st.download_button(f"📥 Download {fmt.upper()} instead", data, name, mime, key=f"dl_{fmt}")
+ 
 def _handle_process(output_dest, workbook_action, start_date, end_date):
     """Core processing handler."""
     if not st.session_state.get("adp_files_data"):
@@ -898,29 +1053,108 @@ def _handle_process(output_dest, workbook_action, start_date, end_date):
         st.stop()
  
     with st.spinner("Processing payroll data..."):
+        # Each stage is skipped when its inputs (and upstream stages) are unchanged
+        # since the last run in this session — e.g. a new override file only
+        # recomputes overrides and the workbook.
+        stages = StageCache(st.session_state.setdefault("_pipeline_stages", {}))
+        frame_cache = _get_frame_cache()
+        alias_store = _get_alias_store()
+        aliases_fp = fingerprint(alias_store.pinned())
+
         # 1. Process Input Files
-        adp_df, _ = process_adp(st.session_state.adp_files_data)
-        relay_df, _ = process_relay(st.session_state.relay_files_data)
-        
-        dp_df = read_flexible_file(st.session_state.driverpay_data, st.session_state.dp_name)
+        adp_fp, adp_df = stages.run(
+            "adp", [st.session_state.adp_files_data],
+            lambda: process_adp(st.session_state.adp_files_data, cache=frame_cache)[0],
+        )
+        relay_fp, relay_df = stages.run(
+            "relay", [st.session_state.relay_files_data],
+            lambda: process_relay(
+                st.session_state.relay_files_data, max_workers=RELAY_WORKERS, cache=frame_cache
+            )[0],
+        )
+        dp_fp, dp_df = stages.run(
+            "driverpay", [st.session_state.driverpay_data, st.session_state.dp_name],
+            lambda: read_flexible_file(st.session_state.driverpay_data, st.session_state.dp_name, cache=frame_cache),
+        )
         if dp_df is None:
             st.error(f"Could not read DriverPay file: {st.session_state.dp_name}")
             st.stop()
  
         # 2. Process Overrides
-        override_map = {}
-        if st.session_state.get("override_data"):
-            override_df = read_flexible_file(st.session_state.override_data, st.session_state.ov_name)
-            if override_df is not None:
-                override_map = build_override_dict(override_df, start_date, end_date, adp_df)
+        def _overrides():
+            if not st.session_state.get("override_data"):
+                return {}
+            override_df = read_flexible_file(st.session_state.override_data, st.session_state.ov_name, cache=frame_cache)
+            if override_df is None:
+                return {}
+            return build_override_dict(
+                override_df, start_date, end_date, adp_df,
+                workers=FUZZY_WORKERS, alias_store=alias_store,
+            )
+ 
+        ov_fp, override_map = stages.run(
+            "overrides",
+            [adp_fp, aliases_fp, st.session_state.get("override_data"), st.session_state.ov_name, start_date, end_date],
+            _overrides,
+        )
  
         # 3. Build Dataset (Handles dropping first chronological relay date)
-        final_df, relay_cols, adp_cols = build_final_dataset(adp_df, relay_df, dp_df)
+        # Copies: build_final_dataset maps driver names in place and the
+        # stage outputs above may be reused by the next run.
+        final_fp, (final_df, relay_cols, adp_cols) = stages.run(
+            "final", [adp_fp, relay_fp, dp_fp, aliases_fp],
+            lambda: build_final_dataset(
+                adp_df, relay_df.copy(), dp_df.copy(),
+                workers=FUZZY_WORKERS, alias_store=alias_store,
+            ),
+        )
         
-        # 4. Generate Excel
-        excel_out, _ = create_excel(final_df, relay_cols, adp_cols, override_map)
+        # 4. Python pay preview (same rules as the workbook formulas)
+        _, pay_df = stages.run(
+            "pay", [final_fp, ov_fp],
+            lambda: compute_pay(final_df, relay_cols, adp_cols, override_map),
+        )
  
-        # 5. Dynamic naming logic
+        # 5. Generate Excel (optional) and tabular exports
+        backend = st.session_state.get("excel_backend", EXCEL_BACKEND)
+        cell_values = st.session_state.get("excel_cell_values", EXCEL_CELL_VALUES)
+        if cell_values == "cached":
+            backend = "xlsxwriter"  # openpyxl can't store formula results
+        excel_out = None
+        skip_excel = st.session_state.get("skip_excel", SKIP_EXCEL)
+        if not skip_excel:
+            # Every writer option is part of the stage key, so changing any
+            # of them rebuilds the workbook instead of serving a stale one.
+            # Sheets merged into an existing workbook keep literal rates, so
+            # earlier periods never pick up another period's Rates sheet.
+            adding_sheet = workbook_action == "Add Sheet to Existing Workbook"
+            excel_options = dict(
+                streaming=EXCEL_STREAMING, backend=backend,
+                conditional_formatting=EXCEL_CONDITIONAL_FORMATTING,
+                compact_formulas=EXCEL_COMPACT_FORMULAS and not adding_sheet,
+                cell_values=cell_values,
+                compress_level=EXCEL_COMPRESS_LEVEL,
+                shared_strings=EXCEL_SHARED_STRINGS,
+                prune_styles=EXCEL_PRUNE_STYLES,
+            )
+            _, excel_out = stages.run(
+                "excel", [final_fp, ov_fp, sorted(excel_options.items())],
+                lambda: create_excel(
+                    final_df, relay_cols, adp_cols, override_map,
+                    pay_df=pay_df, **excel_options,
+                )[0],
+            )
+            st.caption(f"Workbook size: {_size_label(excel_out)}")
+        tables = {}
+        for fmt in st.session_state.get("table_exports", list(TABLE_EXPORTS)):
+            _, tables[fmt] = stages.run(
+                f"table_{fmt}", [final_fp, ov_fp],
+                lambda fmt=fmt: export_table(payroll_table(final_df, pay_df), fmt),
+            )
+        if stages.reused:
+            st.caption(f"Reused unchanged stages: {', '.join(stages.reused)}")
+ 
+        # 6. Dynamic naming logic
         try:
             all_dates = [datetime.strptime(col.replace("A_", ""), "%Y-%m-%d").date() for col in adp_cols]
             period_str = f"{min(all_dates).strftime('%d-%b')} to {max(all_dates).strftime('%d-%b')}"
@@ -929,18 +1163,23 @@ def _handle_process(output_dest, workbook_action, start_date, end_date):
         
         filename = f"Payroll_Report_{period_str}.xlsx"
  
-        # 6. UI Metrics and Preview
-        st.success(f"Excel generated for period: {period_str}")
-        col1, col2, col3, col4 = st.columns(4)
+        # 7. UI Metrics and Preview
+        outputs = ([] if skip_excel else ["Excel"]) + [fmt.upper() for fmt in tables]
+        st.success(f"{', '.join(outputs) or 'Preview'} generated for period: {period_str}")
+        col1, col2, col3, col4, col5 = st.columns(5)
         col1.metric("Drivers", len(final_df))
         col2.metric("Relay Days (Processed)", len(relay_cols))
         col3.metric("ADP Days", len(adp_cols))
         col4.metric("Overrides", len(override_map))
+        col5.metric("Total Final Pay", f"${pay_df['Final Pay'].sum():,.2f}")
         
-        st.dataframe(final_df, use_container_width=True, height=400)
+        st.dataframe(payroll_table(final_df, pay_df), use_container_width=True, height=400)
  
-        # 7. Final Output Delivery
-        if output_dest == "Download Only":
+        # 8. Final Output Delivery
+        _deliver_tables(tables, output_dest, f"Payroll_Report_{period_str}")
+        if excel_out is None:
+            pass  # workbook skipped; only the tables above are delivered
+        elif output_dest == "Download Only":
             st.download_button(
                 "📥 Download Payroll Excel",
                 excel_out.getvalue(),
@@ -959,8 +1198,9 @@ def _handle_process(output_dest, workbook_action, start_date, end_date):
                 path = st.session_state.output_path
  
                 if workbook_action == "Create New Workbook":
-                    ok, err = upload_to_sharepoint(token, site_id, path, filename, excel_out.getvalue())
+                    ok, err = upload_to_sharepoint(token, site_id, path, filename, excel_out)
                     if ok:
+                        _forget_listing(path)
                         st.success(f"✅ Uploaded **{filename}** to `{path}`")
                     else:
                         st.error(f"Upload failed: {err}")
@@ -989,6 +1229,8 @@ def _handle_process(output_dest, workbook_action, start_date, end_date):
                                     existing_bytes,       # existing workbook bytes
                                     excel_out.getvalue(), # new sheet bytes
                                     period_str,           # sheet name
+                                    shared_strings=bool(EXCEL_SHARED_STRINGS),
+                                    compress_level=EXCEL_COMPRESS_LEVEL,
                                 )
  
                             if merge_err or not merged:
@@ -996,11 +1238,13 @@ def _handle_process(output_dest, workbook_action, start_date, end_date):
                                 st.download_button("📥 Download instead", excel_out.getvalue(), filename)
                             else:
                                 with st.spinner(f"Uploading merged {wb_name}..."):
-                                    ok, up_err = upload_to_sharepoint(
-                                        token, site_id, path, wb_name, merged.getvalue()
-                                    )
+                                    ok, up_err = upload_to_sharepoint(token, site_id, path, wb_name, merged)
                                 if ok:
-                                    st.success(f"✅ Sheet **'{period_str}'** added to **{wb_name}**")
+                                    _forget_listing(path)
+                                    st.success(
+                                        f"✅ Sheet **'{period_str}'** added to **{wb_name}** "
+                                        f"({_size_label(merged)})"
+                                    )
                                 else:
                                     st.error(f"Upload failed: {up_err}")
                                     st.download_button("📥 Download instead", excel_out.getvalue(), filename)
@@ -1088,9 +1332,13 @@ def run_app():
     _render_sharepoint_file_picker("Relay Files", ["csv"], "relay_files_data", select_mode="multiple")
     _render_sharepoint_file_picker("DriverPay File", ["csv", "xlsx"], "driverpay_data", state_key_name="dp_name")
     _render_sharepoint_file_picker("Override File", ["csv", "xlsx"], "override_data", state_key_name="ov_name")
+    _render_alias_manager()
  
     output_dest, workbook_action = _render_output_config()
  
     if st.button("🚀 Process and Generate Payroll", type="primary", use_container_width=True):
+        st.session_state.pop("pending_listings", None)  # a rerun would clear the results
         _handle_process(output_dest, workbook_action, start_date, end_date)
+    else:
+        _load_more_items()
  
\ No newline at end of file
@@ -0,0 +1,662 @@
+"""
+Adds generated sheets to an existing .xlsx at the package (zip part) level.
+
+Only the parts that have to change are parsed and rewritten: workbook.xml,
+its relationships, [Content_Types].xml and styles.xml, plus the incoming
+sheets. Every other part, including all existing period sheets, is copied
+into the new zip byte for byte without being parsed. The edited parts
+must use the unprefixed default namespaces openpyxl, xlsxwriter and
+Excel write; anything else raises MergeError so callers can fall back.
+
+tune_package rewrites a generated package for size: shared or inline
+strings, unused style records dropped and the zip compression level.
+"""
+
+import copy
+import io
+import posixpath
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+OFFICE_DOCUMENT = f"{REL_NS}/officeDocument"
+WORKSHEET_REL = f"{REL_NS}/worksheet"
+STYLES_REL = f"{REL_NS}/styles"
+SHARED_STRINGS_REL = f"{REL_NS}/sharedStrings"
+CALC_CHAIN_REL = f"{REL_NS}/calcChain"
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+PACKAGE_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+WORKSHEET_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+
+_ATTR = re.compile(r'([\w:.-]+)="([^"]*)"')
+_UNESCAPE = {"&quot;": '"', "&apos;": "'"}
+
+# styles.xml sections in schema order, with the element each one holds
+_STYLE_SECTIONS = [
+    ("numFmts", "numFmt"), ("fonts", "font"), ("fills", "fill"), ("borders", "border"),
+    ("cellStyleXfs", "xf"), ("cellXfs", "xf"), ("cellStyles", "cellStyle"), ("dxfs", "dxf"),
+]
+_FIRST_CUSTOM_NUMFMT = 164
+
+
+class MergeError(ValueError):
+    """The package has a layout this merge does not handle."""
+
+
+def _attrs(tag):
+    return {k: unescape(v, _UNESCAPE) for k, v in _ATTR.findall(tag)}
+
+
+def _elements(xml, tag):
+    """Top-level <tag> elements of an XML fragment, as strings."""
+    return re.findall(rf"<{tag}\b[^>]*?/>|<{tag}\b(?:[^>]*?[^/])?>.*?</{tag}>", xml, re.S)
+
+
+def _check_root(xml, part, tag, ns):
+    """
+    The edits here are regexes over unprefixed element names. Parts whose
+    root element is prefixed (x:workbook) or in another namespace (Strict
+    OOXML) raise MergeError instead of being edited into a broken package.
+    """
+    match = re.search(r"<([A-Za-z_][\w.:-]*)\b([^>]*)>", xml)
+    if match is None or match.group(1) != tag or _attrs(match.group(2)).get("xmlns") != ns:
+        raise MergeError(f"{part} is not a <{tag}> in the default {ns} namespace")
+    return xml
+
+
+def _insert_before(xml, closing, fragment, part):
+    """Inserts fragment before the first closing tag; MergeError if it's missing."""
+    if closing not in xml:
+        raise MergeError(f"No {closing} in {part}")
+    return xml.replace(closing, fragment + closing, 1)
+
+
+def _resolve(base_part, target):
+    """Part name of a relationship target, relative to the part holding the rels."""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def _rels_path(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, "_rels", f"{name}.rels")
+
+
+class _Package:
+    """An opened .xlsx with the workbook part located and edits kept aside."""
+
+    def __init__(self, data):
+        self.zip = zipfile.ZipFile(io.BytesIO(data))
+        self.names = set(self.zip.namelist())
+        self.changed = {}  # part -> new bytes
+        self.removed = set()
+        root_rels = self.read_xml("_rels/.rels", "Relationships", PACKAGE_RELS_NS)
+        for rel in _elements(root_rels, "Relationship"):
+            a = _attrs(rel)
+            if a.get("Type") == OFFICE_DOCUMENT:
+                self.workbook = _resolve("", a["Target"])
+                break
+        else:
+            raise MergeError("No workbook part in package")
+        self.workbook_rels = _rels_path(self.workbook)
+        self.read_xml(self.workbook, "workbook", MAIN_NS)
+        self.read_xml(self.workbook_rels, "Relationships", PACKAGE_RELS_NS)
+        self.read_xml("[Content_Types].xml", "Types", CONTENT_TYPES_NS)
+
+    def read(self, part):
+        if part in self.changed:
+            return self.changed[part].decode("utf-8")
+        return self.zip.read(part).decode("utf-8")
+
+    def read_xml(self, part, tag, ns=MAIN_NS):
+        """read(part), checked to be a <tag> root in the default ns namespace."""
+        return _check_root(self.read(part), part, tag, ns)
+
+    def write(self, part, text):
+        self.changed[part] = text.encode("utf-8")
+        self.removed.discard(part)
+
+    def remove(self, part):
+        self.changed.pop(part, None)
+        if part in self.names:
+            self.removed.add(part)
+
+    def exists(self, part):
+        return part in self.changed or (part in self.names and part not in self.removed)
+
+    def parts(self):
+        return (self.names - self.removed) | set(self.changed)
+
+    def relationships(self):
+        """[(rel xml, attrs, resolved part)] of the workbook part."""
+        rels = []
+        for rel in _elements(self.read(self.workbook_rels), "Relationship"):
+            a = _attrs(rel)
+            part = None if a.get("TargetMode") == "External" else _resolve(self.workbook, a["Target"])
+            rels.append((rel, a, part))
+        return rels
+
+    def part_for(self, rel_type):
+        for _, a, part in self.relationships():
+            if a.get("Type") == rel_type:
+                return part
+        return None
+
+    def sheets(self):
+        """[(sheet xml, attrs, part)] in tab order."""
+        targets = {a["Id"]: part for _, a, part in self.relationships()}
+        workbook = self.read(self.workbook)
+        block = re.search(r"<sheets\b[^>]*>(.*?)</sheets>", workbook, re.S)
+        if block is None:
+            raise MergeError("Workbook has no sheets")
+        sheets = []
+        for sheet in _elements(block.group(1), "sheet"):
+            a = _attrs(sheet)
+            rid = next((v for k, v in a.items() if k.endswith(":id")), None)
+            sheets.append((sheet, a, targets.get(rid)))
+        return sheets
+
+    def save(self, compress_level=None, recompress=False):
+        """
+        Zip with changed parts deflated at compress_level (None: zlib's
+        default). Every other part is written back with its original
+        ZipInfo (name, date, method) through the public zipfile API, deflated
+        at compress_level too when recompress is set. Parts keep their order
+        in the package.
+        """
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=compress_level) as dst:
+            for info in self.zip.infolist():
+                name = info.filename
+                if name in self.removed:
+                    continue
+                if name in self.changed:
+                    dst.writestr(name, self.changed[name])
+                elif recompress:
+                    dst.writestr(name, self.zip.read(info))
+                else:
+                    # writestr fills in offsets and sizes on the ZipInfo it gets
+                    dst.writestr(copy.copy(info), self.zip.read(info))
+            for name, data in self.changed.items():
+                if name not in self.names:
+                    dst.writestr(name, data)
+        return out.getvalue()
+
+
+class _Styles:
+    """styles.xml as lists of records per section, rendered back in place."""
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.target = {name: self._section(xml, name, tag) for name, tag in _STYLE_SECTIONS}
+
+    @staticmethod
+    def _section(xml, name, tag):
+        match = re.search(rf"<{name}\b[^>]*?(?:/>|>(.*?)</{name}>)", xml, re.S)
+        return _elements(match.group(1) or "", tag) if match else []
+
+    @staticmethod
+    def _remap(element, ids):
+        def sub(match):
+            mapping = ids.get(match.group(1))
+            if mapping is None:
+                return match.group(0)
+            return f'{match.group(1)}="{mapping.get(int(match.group(2)), match.group(2))}"'
+        return re.sub(r'\b(numFmtId|fontId|fillId|borderId|xfId)="(\d+)"', sub, element)
+
+    def _keep(self, section, used):
+        """Drops the records of section not in used; returns old -> new index."""
+        items = self.target[section]
+        kept = sorted(used & set(range(len(items))))
+        self.target[section] = [items[i] for i in kept]
+        return {old: new for new, old in enumerate(kept)}
+
+    def prune(self, used_xfs):
+        """
+        Drops the cell formats no cell refers to, then the named styles,
+        fonts, fills, borders and number formats left unused. Returns the
+        old -> new cellXfs index map for the sheets.
+        """
+        xf_map = self._keep("cellXfs", {0, *used_xfs})
+        cell_xfs = self.target["cellXfs"]
+        style_map = self._keep("cellStyleXfs", {0} | {int(_attrs(xf).get("xfId", 0)) for xf in cell_xfs})
+        self.target["cellStyles"] = [
+            self._remap(style, {"xfId": style_map}) for style in self.target["cellStyles"]
+            if int(_attrs(style)["xfId"]) in style_map
+        ]
+        records = cell_xfs + self.target["cellStyleXfs"]
+        ids = {"xfId": style_map}
+        # Font 0, border 0 and fills 0-1 (none, gray125) are required defaults
+        for section, attr, reserved in (
+            ("fonts", "fontId", {0}), ("fills", "fillId", {0, 1}), ("borders", "borderId", {0}),
+        ):
+            ids[attr] = self._keep(section, reserved | {int(_attrs(xf).get(attr, 0)) for xf in records})
+        used_fmts = {_attrs(xf).get("numFmtId", "0") for xf in records}
+        self.target["numFmts"] = [f for f in self.target["numFmts"] if _attrs(f)["numFmtId"] in used_fmts]
+        self.target["cellXfs"] = [self._remap(xf, ids) for xf in cell_xfs]
+        self.target["cellStyleXfs"] = [
+            self._remap(xf, {k: v for k, v in ids.items() if k != "xfId"})
+            for xf in self.target["cellStyleXfs"]
+        ]
+        return xf_map
+
+    def _append(self, section, element):
+        items = self.target[section]
+        try:
+            return items.index(element)
+        except ValueError:
+            items.append(element)
+            return len(items) - 1
+
+    def render(self):
+        xml = self.xml
+        previous_end = None
+        for name, _ in _STYLE_SECTIONS:
+            items = self.target[name]
+            block = f'<{name} count="{len(items)}">{"".join(items)}</{name}>'
+            match = re.search(rf"<{name}\b[^>]*?(?:/>|>.*?</{name}>)", xml, re.S)
+            if match:
+                start_tag = re.match(rf"<{name}\b[^>]*?(?=/?>)", match.group(0)).group(0)
+                start_tag = re.sub(r'\scount="\d+"', "", start_tag) + f' count="{len(items)}"'
+                block = f'{start_tag}>{"".join(items)}</{name}>'
+                xml = xml[:match.start()] + block + xml[match.end():]
+                previous_end = match.start() + len(block)
+            elif items:
+                # Missing section: goes right after the previous one in schema order
+                if previous_end is None:
+                    previous_end = xml.index(">", xml.index("<styleSheet")) + 1
+                xml = xml[:previous_end] + block + xml[previous_end:]
+                previous_end += len(block)
+        return xml
+
+
+class _StyleMerge(_Styles):
+    """
+    Appends the styles an incoming sheet uses to the target styles.xml and
+    maps its cellXfs / dxf indices onto the target. Identical records are
+    reused, so merging the same kind of sheet every period doesn't grow
+    the stylesheet.
+    """
+
+    def __init__(self, target_xml, source_xml):
+        super().__init__(target_xml)
+        source = _Styles(source_xml).target
+
+        numfmt_map = self._merge_numfmts(source["numFmts"])
+        font_map = self._merge_plain("fonts", source["fonts"])
+        fill_map = self._merge_plain("fills", source["fills"])
+        border_map = self._merge_plain("borders", source["borders"])
+        ids = {"numFmtId": numfmt_map, "fontId": font_map, "fillId": fill_map, "borderId": border_map}
+
+        style_xf_map = self._merge_named_styles(source, ids)
+        ids["xfId"] = style_xf_map
+        self.xf_map = self._merge_plain("cellXfs", [self._remap(xf, ids) for xf in source["cellXfs"]])
+        self.dxf_map = self._merge_plain("dxfs", source["dxfs"])
+
+    def _merge_plain(self, section, elements):
+        return {i: self._append(section, el) for i, el in enumerate(elements)}
+
+    def _merge_numfmts(self, elements):
+        by_code = {}
+        for el in self.target["numFmts"]:
+            a = _attrs(el)
+            by_code[a["formatCode"]] = int(a["numFmtId"])
+        next_id = max([_FIRST_CUSTOM_NUMFMT - 1, *by_code.values()]) + 1
+        mapping = {}
+        for el in elements:
+            a = _attrs(el)
+            code, old_id = a["formatCode"], int(a["numFmtId"])
+            if code not in by_code:
+                by_code[code] = next_id
+                self.target["numFmts"].append(
+                    f'<numFmt numFmtId="{next_id}" formatCode="{escape(code, {chr(34): "&quot;"})}"/>'
+                )
+                next_id += 1
+            mapping[old_id] = by_code[code]
+        return mapping
+
+    def _merge_named_styles(self, source, ids):
+        """Maps source cellStyleXfs to the target; named styles match by name."""
+        by_name = {_attrs(s).get("name"): int(_attrs(s)["xfId"]) for s in self.target["cellStyles"]}
+        mapping = {}
+        for style in source["cellStyles"]:
+            a = _attrs(style)
+            old_xf = int(a["xfId"])
+            if a.get("name") in by_name:
+                mapping[old_xf] = by_name[a["name"]]
+                continue
+            new_xf = self._append("cellStyleXfs", self._remap(source["cellStyleXfs"][old_xf], ids))
+            self.target["cellStyles"].append(re.sub(r'\bxfId="\d+"', f'xfId="{new_xf}"', style))
+            by_name[a.get("name")] = mapping[old_xf] = new_xf
+        for i, xf in enumerate(source["cellStyleXfs"]):
+            if i not in mapping:
+                mapping[i] = self._append("cellStyleXfs", self._remap(xf, ids))
+        return mapping
+
+def _shared_strings(package):
+    part = package.part_for(SHARED_STRINGS_REL)
+    if part is None:
+        return []
+    block = package.read_xml(part, "sst")
+    return [re.sub(r"^<si\b[^>]*>|</si>$|^<si\b[^>]*/>$", "", si, flags=re.S)
+            for si in _elements(block, "si")]
+
+
+class _StringTable:
+    """A sharedStrings table that grows as cells move their text into it."""
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.positions = {}
+        for i, item in enumerate(self.items):
+            self.positions.setdefault(item, i)
+
+    def add(self, text):
+        if text not in self.positions:
+            self.positions[text] = len(self.items)
+            self.items.append(text)
+        return self.positions[text]
+
+    def render(self):
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<sst xmlns="{MAIN_NS}" uniqueCount="{len(self.items)}">'
+            + "".join(f"<si>{item}</si>" for item in self.items)
+            + "</sst>"
+        )
+
+
+def _used_xfs(xml):
+    """cellXfs indices a sheet refers to from its cells, rows and columns."""
+    refs = re.findall(r'<c\b[^>]*?\bs="(\d+)"|<row\b[^>]*?\bs="(\d+)"|<col\b[^>]*?\bstyle="(\d+)"', xml)
+    return {int(index) for groups in refs for index in groups if index}
+
+
+def _rewrite_sheet(xml, xf_map=None, dxf_map=None, strings=None, table=None):
+    """
+    Points a sheet at new style indices and moves its text. Shared string
+    indices refer to strings; with a table, shared and inline strings both
+    become entries of it, otherwise shared strings are inlined. Text is
+    left alone when neither is given.
+    """
+    def cell(match):
+        tag, body = match.group(1), match.group(2)
+        if xf_map is not None:
+            tag = re.sub(r'\bs="(\d+)"', lambda m: f's="{xf_map.get(int(m.group(1)), 0)}"', tag)
+        kind = re.search(r'\bt="(s|inlineStr)"', tag)
+        if body is None or kind is None or (strings is None and table is None):
+            return f"{tag}/>" if body is None else f"{tag}>{body}</c>"
+        if kind.group(1) == "s":
+            found = re.search(r"<v>(\d+)</v>", body)
+            text = strings[int(found.group(1))] if found else None
+        else:
+            found = re.search(r"<is>(.*?)</is>|<is/>", body, re.S)
+            text = (found.group(1) or "") if found and table is not None else None
+        if text is not None:
+            if table is None:
+                tag, body = tag.replace(kind.group(0), 't="inlineStr"'), f"<is>{text}</is>"
+            else:
+                tag, body = tag.replace(kind.group(0), 't="s"'), f"<v>{table.add(text)}</v>"
+        return f"{tag}>{body}</c>"
+
+    xml = re.sub(r"(<c\b[^>]*?)(?:/>|>(.*?)</c>)", cell, xml, flags=re.S)
+    if xf_map is not None:
+        xml = re.sub(r'(<(?:row|col)\b[^>]*?\b(?:s|style)=")(\d+)"',
+                     lambda m: f'{m.group(1)}{xf_map.get(int(m.group(2)), 0)}"', xml)
+    if dxf_map is not None:
+        xml = re.sub(r'\bdxfId="(\d+)"', lambda m: f'dxfId="{dxf_map.get(int(m.group(1)), 0)}"', xml)
+    return xml
+
+
+def _defined_names(workbook_xml):
+    block = re.search(r"<definedNames\b[^>]*>(.*?)</definedNames>", workbook_xml, re.S)
+    return _elements(block.group(1), "definedName") if block else []
+
+
+def _remove_sheet(package, position, sheet_xml, part):
+    workbook = package.read(package.workbook)
+    workbook = workbook.replace(sheet_xml, "", 1)
+
+    # Names scoped to the removed sheet go; later sheets move one tab left
+    def local_name(match):
+        element = match.group(0)
+        local = _attrs(element).get("localSheetId")
+        if local is None or int(local) < position:
+            return element
+        if int(local) == position:
+            return ""
+        return re.sub(r'\blocalSheetId="\d+"', f'localSheetId="{int(local) - 1}"', element)
+    workbook = re.sub(r"<definedName\b[^>]*?(?:/>|>.*?</definedName>)", local_name, workbook, flags=re.S)
+    for attr in ("activeTab", "firstSheet"):
+        workbook = re.sub(
+            rf'\b{attr}="(\d+)"',
+            lambda m: f'{attr}="{max(0, int(m.group(1)) - 1) if int(m.group(1)) >= position else m.group(1)}"',
+            workbook,
+        )
+    package.write(package.workbook, workbook)
+
+    rels = package.read(package.workbook_rels)
+    for rel, _, rel_part in package.relationships():
+        if rel_part == part:
+            rels = rels.replace(rel, "", 1)
+    package.write(package.workbook_rels, rels)
+    _drop_part(package, part)
+
+
+def _rel_targets(package, rels_path):
+    """Parts the relationships in rels_path point to (external targets skipped)."""
+    folder, name = posixpath.split(rels_path)
+    source = posixpath.join(posixpath.dirname(folder), name[:-len(".rels")])
+    rels = package.read_xml(rels_path, "Relationships", PACKAGE_RELS_NS)
+    return [
+        _resolve(source, a["Target"])
+        for a in map(_attrs, _elements(rels, "Relationship"))
+        if a.get("TargetMode") != "External"
+    ]
+
+
+def _drop_part(package, part):
+    """
+    Removes part, its relationships and its content-type override, then
+    the parts it related to (drawings, comments, tables, printer settings)
+    that nothing left in the package refers to.
+    """
+    rels = _rels_path(part)
+    related = _rel_targets(package, rels) if package.exists(rels) else []
+    package.remove(part)
+    package.remove(rels)
+    types = package.read("[Content_Types].xml")
+    types = re.sub(rf'<Override\b[^>]*PartName="/{re.escape(part)}"[^>]*/>', "", types)
+    package.write("[Content_Types].xml", types)
+    if not related:
+        return
+    referenced = {
+        target for other in package.parts() if other.endswith(".rels")
+        for target in _rel_targets(package, other)
+    }
+    for target in related:
+        if target not in referenced and package.exists(target):
+            _drop_part(package, target)
+
+
+def _drop_related(package, rel_type):
+    """Removes the workbook's parts of rel_type and their relationships."""
+    rels = package.read(package.workbook_rels)
+    for rel, a, part in package.relationships():
+        if a.get("Type") == rel_type:
+            rels = rels.replace(rel, "", 1)
+            _drop_part(package, part)
+    package.write(package.workbook_rels, rels)
+
+
+def _add_part(package, part, xml, rel_type, content_type):
+    """Writes a new part related to the workbook; returns its relationship id."""
+    package.write(part, xml)
+
+    rels = package.read(package.workbook_rels)
+    used = {int(m) for m in re.findall(r'\bId="rId(\d+)"', rels)}
+    rid = f"rId{max(used, default=0) + 1}"
+    target = posixpath.relpath(part, posixpath.dirname(package.workbook))
+    rels = _insert_before(
+        rels, "</Relationships>",
+        f'<Relationship Id="{rid}" Type="{rel_type}" Target="{target}"/>', package.workbook_rels,
+    )
+    package.write(package.workbook_rels, rels)
+
+    types = _insert_before(
+        package.read("[Content_Types].xml"), "</Types>",
+        f'<Override PartName="/{part}" ContentType="{content_type}"/>', "[Content_Types].xml",
+    )
+    package.write("[Content_Types].xml", types)
+    return rid
+
+
+def _write_strings(package, table):
+    """Stores table as the workbook's sharedStrings part, adding it if needed."""
+    part = package.part_for(SHARED_STRINGS_REL)
+    if part is None:
+        part = posixpath.join(posixpath.dirname(package.workbook), "sharedStrings.xml")
+        _add_part(package, part, table.render(), SHARED_STRINGS_REL, SHARED_STRINGS_TYPE)
+    else:
+        package.write(part, table.render())
+
+
+def _add_sheet(package, name, state, xml):
+    existing = {part for _, _, part in package.sheets()}
+    number = 1
+    while f"xl/worksheets/sheet{number}.xml" in existing or package.exists(f"xl/worksheets/sheet{number}.xml"):
+        number += 1
+    part = f"xl/worksheets/sheet{number}.xml"
+    rid = _add_part(package, part, xml, WORKSHEET_REL, WORKSHEET_TYPE)
+
+    workbook = package.read(package.workbook)
+    prefix = re.search(rf'xmlns:(\w+)="{re.escape(REL_NS)}"', workbook)
+    if prefix is None:
+        raise MergeError("Workbook has no relationships namespace")
+    sheet_ids = [int(i) for i in re.findall(r'<sheet\b[^>]*?\bsheetId="(\d+)"', workbook)]
+    state_attr = f' state="{state}"' if state and state != "visible" else ""
+    sheet = (
+        f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{max(sheet_ids, default=0) + 1}"'
+        f'{state_attr} {prefix.group(1)}:id="{rid}"/>'
+    )
+    package.write(package.workbook, _insert_before(workbook, "</sheets>", sheet, package.workbook))
+
+
+def _merge_defined_names(package, names):
+    """Adds or replaces workbook-level defined names."""
+    if not names:
+        return
+    workbook = package.read(package.workbook)
+    new_names = {_attrs(n)["name"] for n in names}
+    for element in _defined_names(workbook):
+        a = _attrs(element)
+        if a.get("name") in new_names and "localSheetId" not in a:
+            workbook = workbook.replace(element, "", 1)
+    if "<definedNames" in workbook:
+        workbook = re.sub(r"<definedNames\s*/>", "<definedNames></definedNames>", workbook)
+        workbook = _insert_before(workbook, "</definedNames>", "".join(names), package.workbook)
+    else:
+        # definedNames follows sheets (and externalReferences, if any)
+        anchor = "</externalReferences>" if "</externalReferences>" in workbook else "</sheets>"
+        if anchor not in workbook:
+            raise MergeError(f"No {anchor} in {package.workbook}")
+        workbook = workbook.replace(anchor, f"{anchor}<definedNames>{''.join(names)}</definedNames>", 1)
+    package.write(package.workbook, workbook)
+
+
+def merge_sheets(existing_bytes, new_bytes, sheet_name, shared_strings=False, compress_level=None):
+    """
+    Copies every sheet of the workbook in new_bytes into existing_bytes.
+    The first sheet is added as sheet_name, replacing a same-named sheet
+    (re-running a period). The others (e.g. the hidden Rates sheet) keep
+    their names and, like workbook-level defined names, must not exist in
+    the workbook yet: replacing them would change what every other sheet
+    computes, so MergeError is raised instead. New sheets are appended at
+    the end. Returns the merged .xlsx bytes.
+
+    Text of the new sheets is inlined, or with shared_strings=True added to
+    the workbook's shared strings table (which is then rewritten whole).
+    compress_level applies to the rewritten parts only.
+    """
+    target = _Package(existing_bytes)
+    source = _Package(new_bytes)
+
+    target_styles = target.part_for(STYLES_REL)
+    source_styles = source.part_for(STYLES_REL)
+    if target_styles is None or source_styles is None:
+        raise MergeError("Workbook has no styles part")
+    styles = _StyleMerge(
+        target.read_xml(target_styles, "styleSheet"), source.read_xml(source_styles, "styleSheet"),
+    )
+    strings = _shared_strings(source)
+    table = _StringTable(_shared_strings(target)) if shared_strings else None
+    names = [n for n in _defined_names(source.read(source.workbook)) if "localSheetId" not in _attrs(n)]
+
+    existing_sheets = {a["name"].lower() for _, a, _ in target.sheets()}
+    for _, a, _ in source.sheets()[1:]:
+        if a["name"].lower() in existing_sheets:
+            raise MergeError(f"Workbook already has a sheet named {a['name']}")
+    existing_names = {
+        _attrs(n)["name"].lower() for n in _defined_names(target.read(target.workbook))
+        if "localSheetId" not in _attrs(n)
+    }
+    for element in names:
+        if _attrs(element)["name"].lower() in existing_names:
+            raise MergeError(f"Workbook already defines the name {_attrs(element)['name']}")
+
+    for index, (_, a, part) in enumerate(source.sheets()):
+        if source.exists(_rels_path(part)):
+            raise MergeError(f"Sheet {a['name']} has related parts")
+        name = sheet_name if index == 0 else a["name"]
+        for position, (sheet_xml, existing, existing_part) in enumerate(target.sheets()):
+            if existing["name"].lower() == name.lower():
+                _remove_sheet(target, position, sheet_xml, existing_part)
+                break
+        xml = _rewrite_sheet(source.read_xml(part, "worksheet"), styles.xf_map, styles.dxf_map, strings, table)
+        # Only one tab may be selected in the merged workbook
+        _add_sheet(target, name, a.get("state"), re.sub(r'\stabSelected="1"', "", xml))
+
+    target.write(target_styles, styles.render())
+    if table is not None:
+        _write_strings(target, table)
+    _merge_defined_names(target, names)
+    # Excel rebuilds the calculation chain; a stale one makes it repair the file
+    _drop_related(target, CALC_CHAIN_REL)
+    return target.save(compress_level)
+
+
+def tune_package(data, compress_level=None, shared_strings=None, prune_styles=False):
+    """
+    Rewrites a generated .xlsx for size. shared_strings=True stores every
+    string once in the shared strings table (repeated driver names and
+    categories become indices), False inlines them all and drops the
+    table, None keeps what the writer produced. prune_styles drops style
+    records no cell uses. compress_level (0-9) deflates every part again;
+    None keeps the writer's compression for parts left as they were.
+    Returns the new .xlsx bytes.
+    """
+    package = _Package(data)
+    sheets = [part for _, _, part in package.sheets()]
+    xf_map = strings = table = None
+    if prune_styles:
+        styles_part = package.part_for(STYLES_REL)
+        if styles_part is None:
+            raise MergeError("Workbook has no styles part")
+        styles = _Styles(package.read_xml(styles_part, "styleSheet"))
+        xf_map = styles.prune(set().union(*(_used_xfs(package.read_xml(part, "worksheet")) for part in sheets)))
+        package.write(styles_part, styles.render())
+    if shared_strings is not None:
+        strings = _shared_strings(package)
+        table = _StringTable() if shared_strings else None
+    if xf_map is not None or strings is not None:
+        for part in sheets:
+            package.write(part, _rewrite_sheet(package.read_xml(part, "worksheet"), xf_map, None, strings, table))
+    if shared_strings:
+        _write_strings(package, table)
+    elif shared_strings is False:
+        _drop_related(package, SHARED_STRINGS_REL)
+    return package.save(compress_level, recompress=compress_level is not None)
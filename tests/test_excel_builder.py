@@ -0,0 +1,55 @@
+"""Checks on the workbook XML written by create_excel."""
+
+import io
+import re
+import zipfile
+
+import pandas as pd
+import pytest
+
+from payroll_app.excel_builder import create_excel
+
+DAYS = pd.date_range("2025-02-02", periods=14).strftime("%Y-%m-%d")
+RELAY_COLS = [f"R_{d}" for d in DAYS]
+ADP_COLS = [f"A_{d}" for d in DAYS]
+
+
+def _final_df():
+    rows = []
+    for i, (category, solo5_hours) in enumerate([("PER_LOAD", 31.5), (None, 12.0)]):
+        row = {
+            "Driver": f"DRIVER{i} SMITH",
+            "Category": category,
+            "Package_Amount": None,
+            "Hourly_Rate": 24.0,
+            "Switch_After_Load": None,
+            "Switch_Type": None,
+            "Target_Load": None,
+        }
+        row.update({c: 0.0 for c in RELAY_COLS + ADP_COLS})
+        row[RELAY_COLS[2]] = solo5_hours
+        row[ADP_COLS[2]] = 9.5
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("backend, streaming", [
+    ("openpyxl", False),
+    ("openpyxl", True),
+    ("xlsxwriter", False),
+])
+def test_conditional_format_fills_set_background_colour(backend, streaming):
+    # Excel paints a dxf pattern fill with bgColor; a fill with only fgColor
+    # shows up as no fill at all
+    out, _ = create_excel(
+        _final_df(), RELAY_COLS, ADP_COLS, {},
+        streaming=streaming, backend=backend, conditional_formatting=True,
+    )
+    with zipfile.ZipFile(io.BytesIO(out.getvalue())) as zf:
+        styles = zf.read("xl/styles.xml").decode("utf-8")
+    dxfs = re.search(r"<dxfs\b.*?</dxfs>", styles, re.S).group(0)
+    fills = re.findall(r"<fill>.*?</fill>", dxfs, re.S)
+    assert fills
+    for fill in fills:
+        assert re.search(r'<bgColor rgb="[0-9A-F]{8}"', fill), fill
+    assert any(re.search(r'<bgColor rgb="[0-9A-F]{2}9B59B6"', fill) for fill in fills)
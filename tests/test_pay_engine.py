@@ -0,0 +1,103 @@
+"""Boundary checks for compute_pay against the legacy workbook formulas."""
+
+import pandas as pd
+import pytest
+
+from payroll_app.pay_engine import compute_pay
+
+DAYS = pd.date_range("2025-02-02", periods=14).strftime("%Y-%m-%d")
+RELAY_COLS = [f"R_{d}" for d in DAYS]
+ADP_COLS = [f"A_{d}" for d in DAYS]
+
+
+def _driver(relay=None, adp=None, category=None, switch_at=None, switch_type=None):
+    """One final_df row; relay/adp map day index (0-13) -> hours."""
+    row = {
+        "Driver": "DRIVER SMITH",
+        "Category": category,
+        "Package_Amount": None,
+        "Hourly_Rate": 24.0,
+        "Switch_After_Load": switch_at,
+        "Switch_Type": switch_type,
+        "Target_Load": None,
+    }
+    row.update({c: 0.0 for c in RELAY_COLS + ADP_COLS})
+    row.update({RELAY_COLS[d]: h for d, h in (relay or {}).items()})
+    row.update({ADP_COLS[d]: h for d, h in (adp or {}).items()})
+    return row
+
+
+def _pay(*rows):
+    final_df = pd.DataFrame(list(rows))
+    return compute_pay(final_df, RELAY_COLS, ADP_COLS, {})
+
+
+@pytest.mark.parametrize("loads, expected", [(0, 0), (1, 350), (2, 700), (3, 1000), (4, 1000)])
+def test_tier_base_caps_at_three_loads(loads, expected):
+    # IF(m=1,350,IF(m=2,700,IF(m>=3,1000,0))) with the switch above the load count
+    pay = _pay(_driver(relay={d: 10 for d in range(loads)}, category="TIER_SWITCH", switch_at=5))
+    assert pay["W1_Relay_Loads"].iloc[0] == loads
+    assert pay["Final Pay"].iloc[0] == expected
+
+
+def test_tier_switch_fixed_pays_load_rate_past_switch():
+    # base(2) + (4 - 2) * 350
+    pay = _pay(_driver(relay={d: 10 for d in range(4)}, category="TIER_SWITCH",
+                       switch_at=2, switch_type="FIXED"))
+    assert pay["Final Pay"].iloc[0] == 700 + 2 * 350
+
+
+def test_tier_switch_at_load_count_pays_base_only():
+    pay = _pay(_driver(relay={d: 10 for d in range(2)}, category="TIER_SWITCH",
+                       switch_at=2, switch_type="FIXED"))
+    assert pay["Final Pay"].iloc[0] == 700
+
+
+def test_tier_switch_hourly_pays_adp_hours_on_extra_load_days():
+    # Third load day (index 4) is past the switch; its 8 ADP hours pay 8 * 24
+    pay = _pay(_driver(relay={0: 10, 2: 10, 4: 10}, adp={4: 8, 5: 6},
+                       category="TIER_SWITCH", switch_at=2, switch_type="HOURLY"))
+    assert pay["Final Pay"].iloc[0] == 700 + 8 * 24
+
+
+def test_tier_switch_weeks_are_paid_separately():
+    pay = _pay(_driver(relay={0: 10, 7: 10, 8: 10}, category="TIER_SWITCH", switch_at=5))
+    assert pay["Final Pay"].iloc[0] == 350 + 700
+
+
+@pytest.mark.parametrize("hours, count", [(29.99, 0), (30, 0), (30.01, 1)])
+def test_solo5_needs_more_than_thirty_hours(hours, count):
+    pay = _pay(_driver(relay={3: hours}))
+    assert pay["Solo5_Count"].iloc[0] == count
+    assert pay["Solo5_Pay"].iloc[0] == count * 1800
+    assert pay["Final Pay"].iloc[0] == count * 1800
+
+
+def test_solo5_blocks_add_up_on_top_of_category_pay():
+    pay = _pay(_driver(relay={1: 31, 9: 45, 10: 12}, category="PER_LOAD"))
+    assert pay["Solo5_Count"].iloc[0] == 2
+    assert pay["Final Pay"].iloc[0] == 3 * 350 + 2 * 1800
+
+
+@pytest.mark.parametrize("hours, regular, ot", [(39.5, 39.5, 0), (40, 40, 0), (40.5, 40, 0.5)])
+def test_overtime_starts_after_forty_hours(hours, regular, ot):
+    pay = _pay(_driver(adp={0: hours}))
+    assert pay["W1 Regular"].iloc[0] == regular
+    assert pay["W1 OT"].iloc[0] == ot
+    assert pay["Pay by Hours"].iloc[0] == regular * 24 + ot * 36
+    assert pay["Final Pay"].iloc[0] == regular * 24 + ot * 36
+    assert pd.isna(pay["Hour Adjustment"].iloc[0])
+
+
+def test_overtime_is_split_per_week():
+    # 45h + 35h is 80h in total but still 5h of week-one overtime
+    pay = _pay(_driver(adp={0: 20, 1: 25, 7: 35}))
+    assert pay["Total Regular"].iloc[0] == 75
+    assert pay["Total OT"].iloc[0] == 5
+    assert pay["Pay by Hours"].iloc[0] == 75 * 24 + 5 * 36
+
+
+def test_hour_adjustment_for_driverpay_rows():
+    # (Final Pay - Pay by Hours) / 36
+    pay = _pay(_driver(relay={0: 10}, adp={0: 10}, category="PER_LOAD"))
+    assert pay["Hour Adjustment"].iloc[0] == pytest.approx((350 - 240) / 36)
@@ -0,0 +1,43 @@
+"""Parsing of the uploaded ADP and Relay exports."""
+
+import datetime as dt
+
+import pandas as pd
+
+from payroll_app.processing import _parse_date_time, process_adp
+
+
+def test_adp_export_with_ragged_footer_and_text_hours():
+    footer = (
+        b"Payroll Name,Pay Date,Hours,Department\n"
+        b"\"SMITH, JOHN\",2025-02-03,8,Linehaul\n"
+        b"DOE JANE,2025-02-03,7.5,Linehaul\n"
+        b"Total,,\n"
+    )
+    text_hours = b"Payroll Name,Pay Date,Hours\nDOE JANE,2025-02-04,abc\nDOE JANE,2025-02-05,6\n"
+
+    df, _ = process_adp([footer, text_hours])
+
+    rows = set(map(tuple, df[["Driver", "Date", "Hours"]].to_numpy().tolist()))
+    assert rows == {
+        ("SMITH JOHN", dt.date(2025, 2, 3), 8.0),
+        ("DOE JANE", dt.date(2025, 2, 3), 7.5),
+        ("DOE JANE", dt.date(2025, 2, 4), 0.0),
+        ("DOE JANE", dt.date(2025, 2, 5), 6.0),
+    }
+
+
+def _parsed_days(dates):
+    parsed = _parse_date_time(pd.Series(dates), pd.Series(["08:00"] * len(dates)))
+    return parsed.dt.strftime("%Y-%m-%d").tolist()
+
+
+def test_day_first_dates_after_an_ambiguous_first_value():
+    assert _parsed_days(["03/02/2024", "14/02/2024", "05/02/2024"]) == [
+        "2024-02-03", "2024-02-14", "2024-02-05",
+    ]
+
+
+def test_ambiguous_dates_stay_month_first():
+    assert _parsed_days(["03/02/2024", "04/02/2024"]) == ["2024-03-02", "2024-04-02"]
+    assert _parsed_days(["03/02/2024", "02/14/2024"]) == ["2024-03-02", "2024-02-14"]
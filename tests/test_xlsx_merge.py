@@ -0,0 +1,243 @@
+"""Zip-level workbook merging and package tuning."""
+
+import io
+import re
+import struct
+import zipfile
+import zlib
+
+import pandas as pd
+import pytest
+import xlsxwriter
+from openpyxl import Workbook, load_workbook
+from openpyxl.workbook.defined_name import DefinedName
+
+from payroll_app.excel_builder import create_excel
+from payroll_app.xlsx_merge import MergeError, merge_sheets, tune_package
+
+DAYS = pd.date_range("2025-02-02", periods=14).strftime("%Y-%m-%d")
+RELAY_COLS = [f"R_{d}" for d in DAYS]
+ADP_COLS = [f"A_{d}" for d in DAYS]
+
+
+def _final_df():
+    rows = []
+    for i, category in enumerate(["PER_LOAD", "TIER_SWITCH", None]):
+        row = {
+            "Driver": f"DRIVER{i} SMITH",
+            "Category": category,
+            "Package_Amount": None,
+            "Hourly_Rate": 24.0,
+            "Switch_After_Load": 2,
+            "Switch_Type": "FIXED",
+            "Target_Load": None,
+        }
+        row.update({c: 0.0 for c in RELAY_COLS + ADP_COLS})
+        row[RELAY_COLS[i]] = 10.0 + i
+        row[ADP_COLS[i]] = 8.5
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _generated(**options):
+    out, _ = create_excel(_final_df(), RELAY_COLS, ADP_COLS, {}, **options)
+    return out.getvalue()
+
+
+def _save(wb):
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _existing_workbook():
+    """A saved workbook with its own styles and a shared strings table."""
+    out = io.BytesIO()
+    wb = xlsxwriter.Workbook(out)
+    ws = wb.add_worksheet("History")
+    bold = wb.add_format({"bold": True, "font_color": "#FF0000"})
+    money = wb.add_format({"bg_color": "#00FF00", "num_format": "0.00"})
+    ws.write_row(0, 0, ["Driver", "Pay", "Note"], bold)
+    ws.write_row(1, 0, ["DRIVER0 SMITH", 1234.5, "paid"])
+    ws.write_row(2, 0, ["DRIVER9 JONES", 99, "paid"])
+    ws.write(1, 1, 1234.5, money)
+    wb.close()
+    return out.getvalue()
+
+
+def _cells(ws):
+    """{coordinate: (value, font, fill, number format)} of every non-empty cell."""
+    return {
+        cell.coordinate: (
+            cell.value,
+            bool(cell.font.b), cell.font.color.rgb if cell.font.color else None,
+            cell.fill.fill_type, cell.fill.fgColor.rgb,
+            cell.number_format,
+        )
+        for row in ws.iter_rows() for cell in row
+        if cell.value is not None or cell.has_style
+    }
+
+
+def _sheet(data, name=None):
+    wb = load_workbook(io.BytesIO(data))
+    return wb[name] if name else wb.worksheets[0]
+
+
+def _shared_strings(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        if "xl/sharedStrings.xml" not in zf.namelist():
+            return None
+        xml = zf.read("xl/sharedStrings.xml").decode("utf-8")
+    return re.findall(r"<t[^>]*>([^<]*)</t>", xml)
+
+
+@pytest.mark.parametrize("shared_strings", [False, True])
+def test_merge_keeps_existing_sheet_and_copies_new_one_cell_by_cell(shared_strings):
+    existing = _existing_workbook()
+    assert _shared_strings(existing)
+    new = _generated()
+    merged = merge_sheets(existing, new, "P1", shared_strings=shared_strings)
+
+    assert load_workbook(io.BytesIO(merged)).sheetnames == ["History", "P1"]
+    assert _cells(_sheet(merged, "History")) == _cells(_sheet(existing))
+    assert _cells(_sheet(merged, "P1")) == _cells(_sheet(new))
+
+
+def test_merge_with_shared_strings_reuses_the_existing_table():
+    merged = merge_sheets(_existing_workbook(), _generated(), "P1", shared_strings=True)
+    strings = _shared_strings(merged)
+    assert len(strings) == len(set(strings))
+    assert {"Driver", "paid", "DRIVER0 SMITH", "DRIVER1 SMITH"} <= set(strings)
+
+
+def test_repeated_merge_of_a_period_replaces_its_sheet():
+    first = merge_sheets(_existing_workbook(), _generated(), "P1")
+    second = merge_sheets(first, _generated(), "P2")
+    rerun = _final_df()
+    rerun.loc[0, RELAY_COLS[5]] = 7.0
+    new = create_excel(rerun, RELAY_COLS, ADP_COLS, {})[0].getvalue()
+    again = merge_sheets(second, new, "P1")
+
+    assert load_workbook(io.BytesIO(again)).sheetnames == ["History", "P2", "P1"]
+    assert _cells(_sheet(again, "P1")) == _cells(_sheet(new))
+    assert _cells(_sheet(again, "P2")) == _cells(_sheet(second, "P2"))
+    assert _cells(_sheet(again, "History")) == _cells(_sheet(_existing_workbook()))
+
+
+@pytest.mark.parametrize("backend", ["openpyxl", "xlsxwriter"])
+@pytest.mark.parametrize("shared_strings", [None, False, True])
+def test_tune_package_keeps_cells(backend, shared_strings):
+    data = _generated(backend=backend, conditional_formatting=True)
+    tuned = tune_package(data, compress_level=9, shared_strings=shared_strings, prune_styles=True)
+
+    assert _cells(_sheet(tuned)) == _cells(_sheet(data))
+    strings = _shared_strings(tuned)
+    if shared_strings is False:
+        assert strings is None
+    elif shared_strings:
+        assert "DRIVER0 SMITH" in strings and len(strings) == len(set(strings))
+
+
+def test_prune_styles_drops_formats_left_by_a_replaced_sheet():
+    def xf_count(data):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            styles = zf.read("xl/styles.xml").decode("utf-8")
+        return int(re.search(r'<cellXfs count="(\d+)"', styles).group(1))
+
+    merged = merge_sheets(_existing_workbook(), _generated(), "P1")
+    merged = merge_sheets(merged, _generated(backend="xlsxwriter"), "P1")
+    pruned = tune_package(merged, prune_styles=True)
+
+    assert xf_count(pruned) < xf_count(merged)
+    for name in ["History", "P1"]:
+        assert _cells(_sheet(pruned, name)) == _cells(_sheet(merged, name))
+
+
+def _png():
+    """A 1x1 PNG for image parts."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\x00"))
+        + chunk(b"IEND", b"")
+    )
+
+
+def test_replacing_a_sheet_drops_its_related_parts():
+    out = io.BytesIO()
+    wb = xlsxwriter.Workbook(out)
+    keep = wb.add_worksheet("Keep")
+    keep.insert_image("B2", "logo.png", {"image_data": io.BytesIO(_png())})
+    old = wb.add_worksheet("P1")
+    old.write_row(0, 0, ["Driver", "Pay"])
+    old.write_row(1, 0, ["DRIVER0 SMITH", 100])
+    old.add_table("A1:B2", {"columns": [{"header": "Driver"}, {"header": "Pay"}]})
+    old.write_comment("B2", "checked")
+    old.insert_image("D2", "logo.png", {"image_data": io.BytesIO(_png())})
+    old.set_landscape()
+    wb.close()
+    existing = out.getvalue()
+
+    merged = merge_sheets(existing, _generated(), "P1")
+
+    with zipfile.ZipFile(io.BytesIO(existing)) as zf:
+        before = set(zf.namelist())
+    with zipfile.ZipFile(io.BytesIO(merged)) as zf:
+        after = set(zf.namelist())
+        types = zf.read("[Content_Types].xml").decode("utf-8")
+    dropped = before - after
+    assert {"xl/tables/table1.xml", "xl/comments1.xml", "xl/drawings/drawing2.xml"} <= dropped
+    assert any(name.startswith("xl/drawings/vmlDrawing") for name in dropped)
+    # Still used by the Keep sheet's drawing
+    assert {"xl/drawings/drawing1.xml", "xl/media/image1.png"} <= after
+    for part in dropped:
+        assert f'PartName="/{part}"' not in types
+    assert load_workbook(io.BytesIO(merged)).sheetnames == ["Keep", "P1"]
+
+
+def _prefixed(data, part):
+    """data with part rewritten to a prefixed main namespace (<x:workbook>)."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(out, "w") as dst:
+        for info in src.infolist():
+            content = src.read(info)
+            if info.filename == part:
+                xml = re.sub(r"<(/?)(\w+)\b", r"<\1x:\2", content.decode("utf-8"))
+                content = xml.replace('xmlns="', 'xmlns:x="', 1).encode("utf-8")
+            dst.writestr(info, content)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("part", [
+    "xl/workbook.xml", "xl/_rels/workbook.xml.rels", "[Content_Types].xml", "xl/styles.xml",
+    "xl/sharedStrings.xml",
+])
+def test_merge_refuses_prefixed_parts(part):
+    existing = _prefixed(_existing_workbook(), part)
+    with pytest.raises(MergeError, match=re.escape(part)):
+        merge_sheets(existing, _generated(), "P1", shared_strings=True)
+
+
+def test_tune_package_refuses_prefixed_sheets():
+    data = _prefixed(_generated(backend="xlsxwriter"), "xl/worksheets/sheet1.xml")
+    with pytest.raises(MergeError, match="sheet1"):
+        tune_package(data, prune_styles=True)
+
+
+def test_helper_sheets_never_replace_existing_ones():
+    wb = Workbook()
+    wb.active.title = "Notes"
+    wb.create_sheet("rates")["A1"] = "mine"
+    with pytest.raises(MergeError, match="Rates"):
+        merge_sheets(_save(wb), _generated(compact_formulas=True), "P1")
+
+
+def test_defined_names_never_replace_existing_ones():
+    wb = Workbook()
+    wb.active.title = "Notes"
+    wb.defined_names["tierpay"] = DefinedName("tierpay", attr_text="Notes!$A$1")
+    with pytest.raises(MergeError, match="TierPay"):
+        merge_sheets(_save(wb), _generated(compact_formulas=True), "P1")